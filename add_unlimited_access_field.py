@@ -38,15 +38,11 @@ async def add_unlimited_access_field():
         
         if not result:
             logger.info("➕ Добавляем колонку unlimited_access...")
-            try:
-                add_column_query = "ALTER TABLE users ADD COLUMN unlimited_access BOOLEAN DEFAULT FALSE"
-                await adapter.execute(add_column_query)
-                logger.info("✅ Колонка unlimited_access добавлена")
-            except Exception as e:
-                if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                    logger.info("✅ Колонка unlimited_access уже существует (из ошибки)")
-                else:
-                    raise e
+            # IF NOT EXISTS: столбец мог появиться между проверкой и ALTER,
+            # разбирать текст ошибки не нужно
+            add_column_query = "ALTER TABLE users ADD COLUMN IF NOT EXISTS unlimited_access BOOLEAN DEFAULT FALSE"
+            await adapter.execute(add_column_query)
+            logger.info("✅ Колонка unlimited_access добавлена")
         else:
             logger.info("✅ Колонка unlimited_access уже существует")
         
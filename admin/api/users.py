@@ -321,6 +321,7 @@ async def manage_user_subscription(
                 params = (new_end, user_id)
 
             await db.adapter.execute(query, params)
+            db.invalidate_user_cache(user_id)
             await db.adapter.disconnect()
 
             action_text = "активирована" if action == 'activate' else "продлена"
@@ -346,6 +347,7 @@ async def manage_user_subscription(
                 params = (user_id,)
 
             await db.adapter.execute(query, params)
+            db.invalidate_user_cache(user_id)
             await db.adapter.disconnect()
 
             return {"success": True, "message": "Подписка отменена"}
@@ -101,7 +101,7 @@ class DatabaseConnectionMiddleware(BaseHTTPMiddleware):
         """Убедиться, что соединение с БД здоровое"""
         try:
             # Проверяем соединение
-            if not db.adapter.connection or db.adapter.connection.is_closed():
+            if not db.adapter.is_connected:
                 logger.debug("🔄 Переподключение к базе данных...")
                 await db.adapter.connect()
             
@@ -1,40 +1,209 @@
 """
 Миграции для админ-панели
+
+После выполнения миграций запускается ANALYZE, чтобы планировщик SQLite
+имел статистику по индексам. Соединения приложения рекомендуется
+закрывать с PRAGMA optimize, чтобы эта статистика оставалась актуальной.
+
+PRAGMA mmap_size действует только в рамках соединения, поэтому его нужно
+устанавливать при каждом aiosqlite.connect в фабрике соединений приложения.
+То же относится к synchronous, temp_store, cache_size и busy_timeout;
+journal_mode=WAL, напротив, сохраняется в файле базы и действует для всех
+последующих соединений.
 """
 import aiosqlite
 import logging
-from typing import List
+import zlib
+from typing import ClassVar, FrozenSet, List, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Контекст passlib создается лениво и переиспользуется: импорт и выбор
+# backend'а bcrypt нужны только при создании админа по умолчанию
+_PWD_CTX = None
+
+
+def _get_pwd_context():
+    """Получить (и при первом вызове создать) контекст хеширования паролей"""
+    global _PWD_CTX
+    if _PWD_CTX is None:
+        from passlib.context import CryptContext
+        _PWD_CTX = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
+    return _PWD_CTX
+
 
 class AdminMigrations:
     """Класс для выполнения миграций админ-панели"""
-    
+
+    _SAVEPOINT = "admin_migration"
+
+    # 256 МБ: файл базы бота небольшой и целиком отображается в память
+    _MMAP_SIZE = 256 * 1024 * 1024
+
+    # Настройки соединения для конкурентной работы с ботом: NORMAL в WAL
+    # безопасен, кэш 64 МБ, временные таблицы в памяти, ожидание блокировки 30 с
+    _CONNECTION_PRAGMAS: ClassVar[Tuple[str, ...]] = (
+        "synchronous=NORMAL",
+        "temp_store=MEMORY",
+        "cache_size=-64000",
+        "busy_timeout=30000",
+    )
+
+    # Миграции в порядке выполнения: (имя миграции, имя метода)
+    _MIGRATIONS: ClassVar[Tuple[Tuple[str, str], ...]] = (
+        ('create_all_tables', '_create_all_tables'),
+        ('extend_users_table', '_extend_users_table'),
+        ('extend_broadcasts_table', '_extend_broadcasts_table'),
+        ('add_status_to_broadcasts', '_add_status_to_broadcasts'),
+        ('add_title_to_broadcasts', '_add_title_to_broadcasts'),
+        ('insert_default_roles', '_insert_default_roles'),
+        ('create_default_admin_user', '_create_default_admin_user'),
+        ('add_telegram_user_roles', '_add_telegram_user_roles'),
+        ('assign_default_telegram_roles', '_assign_default_telegram_roles'),
+        ('create_admin_indexes', '_create_admin_indexes'),
+    )
+
+    # DDL всех таблиц админ-панели: выражения выполняются по одному в транзакции миграции
+    _ALL_TABLES_DDL: ClassVar[str] = """
+        CREATE TABLE IF NOT EXISTS admin_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'moderator',
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            created_by INTEGER,
+            FOREIGN KEY (created_by) REFERENCES admin_users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            permissions TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS message_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            content TEXT NOT NULL,
+            parse_mode TEXT DEFAULT 'HTML',
+            category TEXT DEFAULT 'general',
+            is_active BOOLEAN DEFAULT TRUE,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES admin_users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            template_id INTEGER,
+            message_text TEXT,
+            parse_mode TEXT DEFAULT 'HTML',
+            scheduled_at TIMESTAMP NOT NULL,
+            status TEXT DEFAULT 'pending',
+            target_users TEXT DEFAULT 'all',
+            sent_count INTEGER DEFAULT 0,
+            failed_count INTEGER DEFAULT 0,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            error_message TEXT,
+            FOREIGN KEY (template_id) REFERENCES message_templates (id),
+            FOREIGN KEY (created_by) REFERENCES admin_users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_user_id INTEGER,
+            action TEXT NOT NULL,
+            resource_type TEXT NOT NULL,
+            resource_id INTEGER,
+            details TEXT,
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (admin_user_id) REFERENCES admin_users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS ab_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            variant_a_template_id INTEGER,
+            variant_b_template_id INTEGER,
+            split_ratio REAL DEFAULT 0.5,
+            status TEXT DEFAULT 'draft',
+            start_date TIMESTAMP,
+            end_date TIMESTAMP,
+            variant_a_sent INTEGER DEFAULT 0,
+            variant_b_sent INTEGER DEFAULT 0,
+            variant_a_success INTEGER DEFAULT 0,
+            variant_b_success INTEGER DEFAULT 0,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (variant_a_template_id) REFERENCES message_templates (id),
+            FOREIGN KEY (variant_b_template_id) REFERENCES message_templates (id),
+            FOREIGN KEY (created_by) REFERENCES admin_users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS broadcast_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            error_details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (broadcast_id) REFERENCES broadcasts (id)
+        );
+
+        -- Выборки по broadcast_id покрывают составные индексы ниже
+        DROP INDEX IF EXISTS idx_broadcast_logs_broadcast_id;
+
+        CREATE INDEX IF NOT EXISTS idx_broadcast_logs_status
+        ON broadcast_logs (broadcast_id, status);
+
+        CREATE INDEX IF NOT EXISTS idx_broadcast_logs_created_at
+        ON broadcast_logs (broadcast_id, created_at);
+    """
+
+    # Отпечаток набора миграций хранится в PRAGMA user_version (знаковое
+    # 32-битное число), поэтому обрезаем crc32 до 31 бита
+    schema_fingerprint: ClassVar[int] = zlib.crc32(
+        b"|".join(name.encode() for name, _ in _MIGRATIONS)
+    ) & 0x7FFFFFFF
+
     def __init__(self, db_path: str = "bot.db"):
         self.db_path = db_path
-    
+
     async def run_migrations(self):
         """Выполнить все миграции"""
-        migrations = [
-            ('create_admin_users_table', self._create_admin_users_table),
-            ('create_roles_table', self._create_roles_table),
-            ('create_message_templates_table', self._create_message_templates_table),
-            ('create_scheduled_broadcasts_table', self._create_scheduled_broadcasts_table),
-            ('create_audit_logs_table', self._create_audit_logs_table),
-            ('create_ab_tests_table', self._create_ab_tests_table),
-            ('create_broadcast_logs_table', self._create_broadcast_logs_table),
-            ('extend_users_table', self._extend_users_table),
-            ('extend_broadcasts_table', self._extend_broadcasts_table),
-            ('add_status_to_broadcasts', self._add_status_to_broadcasts),
-            ('add_title_to_broadcasts', self._add_title_to_broadcasts),
-            ('insert_default_roles', self._insert_default_roles),
-            ('create_default_admin_user', self._create_default_admin_user),
-            ('add_telegram_user_roles', self._add_telegram_user_roles),
-            ('assign_default_telegram_roles', self._assign_default_telegram_roles)
-        ]
+        # isolation_level=None: транзакциями управляем явно, чтобы весь прогон
+        # миграций фиксировался одним COMMIT (один fsync вместо десятков)
+        async with aiosqlite.connect(self.db_path, isolation_level=None) as db:
+            await db.execute(f"PRAGMA mmap_size={self._MMAP_SIZE}")
+            for pragma in self._CONNECTION_PRAGMAS:
+                await db.execute(f"PRAGMA {pragma}")
+            if self.db_path != ":memory:":
+                # WAL: читатели не блокируются записью миграций и наоборот
+                await db.execute("PRAGMA journal_mode=WAL")
+
+            # Быстрая проверка: если отпечаток совпадает, все миграции уже
+            # выполнены и schema_migrations можно не читать
+            cursor = await db.execute("PRAGMA user_version")
+            (user_version,) = await cursor.fetchone()
+            if user_version == self.schema_fingerprint:
+                logger.info("Схема админ-панели актуальна, пропускаем миграции")
+                return
 
-        async with aiosqlite.connect(self.db_path) as db:
             # Создаем таблицу для отслеживания миграций
             await self._create_migrations_table(db)
 
@@ -42,18 +211,39 @@ class AdminMigrations:
             executed_migrations = await self._get_executed_migrations(db)
 
             migrations_executed = 0
-            for migration_name, migration_func in migrations:
+            migrations_failed = 0
+            # IMMEDIATE сразу берет блокировку записи: без SQLITE_BUSY при
+            # повышении блокировки, если параллельно пишет бот
+            await db.execute("BEGIN IMMEDIATE")
+            for migration_name, method_name in self._MIGRATIONS:
                 if migration_name not in executed_migrations:
+                    # Каждая миграция в своей точке сохранения: ошибка откатывает
+                    # только ее, а не весь пакет
+                    await db.execute(f"SAVEPOINT {self._SAVEPOINT}")
                     try:
-                        await migration_func(db)
+                        await getattr(self, method_name)(db)
                         await self._mark_migration_executed(db, migration_name)
+                        await db.execute(f"RELEASE SAVEPOINT {self._SAVEPOINT}")
                         logger.info(f"Миграция {migration_name} выполнена успешно")
                         migrations_executed += 1
                     except Exception as e:
+                        await db.execute(f"ROLLBACK TO SAVEPOINT {self._SAVEPOINT}")
+                        await db.execute(f"RELEASE SAVEPOINT {self._SAVEPOINT}")
                         logger.error(f"Ошибка выполнения миграции {migration_name}: {e}")
+                        migrations_failed += 1
                         # Продолжаем выполнение других миграций
 
-            await db.commit()
+            # Отпечаток записываем только после полностью успешного прогона,
+            # иначе при следующем запуске сработает учет по schema_migrations
+            if migrations_failed == 0:
+                await db.execute(f"PRAGMA user_version = {self.schema_fingerprint}")
+
+            await db.execute("COMMIT")
+
+            if migrations_executed:
+                # Собираем статистику для планировщика запросов по новой схеме
+                await db.execute("ANALYZE")
+                await db.execute("PRAGMA optimize")
 
             if migrations_executed == 0:
                 logger.info("Все миграции уже выполнены, пропускаем")
@@ -70,15 +260,37 @@ class AdminMigrations:
             )
         """)
 
-    async def _get_executed_migrations(self, db: aiosqlite.Connection) -> set:
+    async def _get_executed_migrations(self, db: aiosqlite.Connection) -> FrozenSet[str]:
         """Получить список выполненных миграций"""
+        # Строки нужны только как кортежи: без row_factory выборка дешевле
+        db.row_factory = None
         try:
             cursor = await db.execute("SELECT migration_name FROM schema_migrations")
             rows = await cursor.fetchall()
-            return {row[0] for row in rows}
+            return frozenset(row[0] for row in rows)
         except aiosqlite.OperationalError:
             # Таблица не существует, возвращаем пустой набор
-            return set()
+            return frozenset()
+
+    async def _existing_columns(self, db: aiosqlite.Connection, table: str) -> Set[str]:
+        """Получить имена колонок таблицы одним запросом"""
+        if not isinstance(db, aiosqlite.Connection):
+            # Обертка PostgreSQL из UnifiedMigrationManager: pragma_table_info там нет
+            return await db.existing_columns(table)
+        cursor = await db.execute("SELECT name FROM pragma_table_info(?)", (table,))
+        rows = await cursor.fetchall()
+        return {row[0] for row in rows}
+
+    async def _execute_statements(self, db: aiosqlite.Connection, script: str):
+        """Выполнить DDL-выражения скрипта по одному
+
+        Не executescript(): он фиксирует открытую транзакцию, и ошибка на середине
+        скрипта оставила бы уже созданные таблицы. Через execute() все выражения
+        идут в транзакции и точке сохранения текущей миграции и откатываются вместе.
+        """
+        for statement in script.split(";"):
+            if statement.strip():
+                await db.execute(statement)
 
     async def _mark_migration_executed(self, db: aiosqlite.Connection, migration_name: str):
         """Отметить миграцию как выполненную"""
@@ -87,153 +299,26 @@ class AdminMigrations:
             (migration_name,)
         )
     
-    async def _create_admin_users_table(self, db: aiosqlite.Connection):
-        """Создать таблицу админ пользователей"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS admin_users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'moderator',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                created_by INTEGER,
-                FOREIGN KEY (created_by) REFERENCES admin_users (id)
-            )
-        """)
-    
-    async def _create_roles_table(self, db: aiosqlite.Connection):
-        """Создать таблицу ролей"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                display_name TEXT NOT NULL,
-                permissions TEXT NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    
-    async def _create_message_templates_table(self, db: aiosqlite.Connection):
-        """Создать таблицу шаблонов сообщений"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS message_templates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                content TEXT NOT NULL,
-                parse_mode TEXT DEFAULT 'HTML',
-                category TEXT DEFAULT 'general',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (created_by) REFERENCES admin_users (id)
-            )
-        """)
-    
-    async def _create_scheduled_broadcasts_table(self, db: aiosqlite.Connection):
-        """Создать таблицу планировщика рассылок"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                template_id INTEGER,
-                message_text TEXT,
-                parse_mode TEXT DEFAULT 'HTML',
-                scheduled_at TIMESTAMP NOT NULL,
-                status TEXT DEFAULT 'pending',
-                target_users TEXT DEFAULT 'all',
-                sent_count INTEGER DEFAULT 0,
-                failed_count INTEGER DEFAULT 0,
-                created_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                started_at TIMESTAMP,
-                completed_at TIMESTAMP,
-                error_message TEXT,
-                FOREIGN KEY (template_id) REFERENCES message_templates (id),
-                FOREIGN KEY (created_by) REFERENCES admin_users (id)
-            )
-        """)
-    
-    async def _create_audit_logs_table(self, db: aiosqlite.Connection):
-        """Создать таблицу логов действий"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admin_user_id INTEGER,
-                action TEXT NOT NULL,
-                resource_type TEXT NOT NULL,
-                resource_id INTEGER,
-                details TEXT,
-                ip_address TEXT,
-                user_agent TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (admin_user_id) REFERENCES admin_users (id)
-            )
-        """)
-    
-    async def _create_ab_tests_table(self, db: aiosqlite.Connection):
-        """Создать таблицу A/B тестов"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS ab_tests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                variant_a_template_id INTEGER,
-                variant_b_template_id INTEGER,
-                split_ratio REAL DEFAULT 0.5,
-                status TEXT DEFAULT 'draft',
-                start_date TIMESTAMP,
-                end_date TIMESTAMP,
-                variant_a_sent INTEGER DEFAULT 0,
-                variant_b_sent INTEGER DEFAULT 0,
-                variant_a_success INTEGER DEFAULT 0,
-                variant_b_success INTEGER DEFAULT 0,
-                created_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (variant_a_template_id) REFERENCES message_templates (id),
-                FOREIGN KEY (variant_b_template_id) REFERENCES message_templates (id),
-                FOREIGN KEY (created_by) REFERENCES admin_users (id)
-            )
-        """)
-
-    async def _create_broadcast_logs_table(self, db: aiosqlite.Connection):
-        """Создать таблицу логов рассылок"""
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS broadcast_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                broadcast_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                status TEXT NOT NULL,
-                message TEXT,
-                error_details TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (broadcast_id) REFERENCES broadcasts (id)
-            )
-        """)
-
-        # Создаем индексы для оптимизации запросов
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_broadcast_logs_broadcast_id
-            ON broadcast_logs (broadcast_id)
-        """)
-
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_broadcast_logs_status
-            ON broadcast_logs (broadcast_id, status)
-        """)
-
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_broadcast_logs_created_at
-            ON broadcast_logs (broadcast_id, created_at)
+    async def _create_all_tables(self, db: aiosqlite.Connection):
+        """Создать все таблицы админ-панели и индексы логов рассылок"""
+        await self._execute_statements(db, self._ALL_TABLES_DDL)
+
+    async def _create_admin_indexes(self, db: aiosqlite.Connection):
+        """Создать индексы для частых запросов админ-панели"""
+        # SQLite не индексирует внешние ключи автоматически
+        await self._execute_statements(db, """
+            CREATE INDEX IF NOT EXISTS idx_audit_admin_time
+            ON audit_logs (admin_user_id, created_at DESC);
+
+            CREATE INDEX IF NOT EXISTS idx_sched_status_time
+            ON scheduled_broadcasts (status, scheduled_at);
+
+            CREATE INDEX IF NOT EXISTS idx_admin_users_active
+            ON admin_users (is_active, username);
         """)
 
     async def _extend_users_table(self, db: aiosqlite.Connection):
         """Расширить таблицу пользователей"""
-        # Проверяем существование колонок перед добавлением
         columns_to_add = [
             ("role", "TEXT DEFAULT 'user'"),
             ("unlimited_access", "BOOLEAN DEFAULT FALSE"),
@@ -245,13 +330,11 @@ class AdminMigrations:
             ("referrer_id", "INTEGER"),
             ("registration_source", "TEXT DEFAULT 'bot'")
         ]
-        
+
+        existing_columns = await self._existing_columns(db, "users")
         for column_name, column_def in columns_to_add:
-            try:
+            if column_name not in existing_columns:
                 await db.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}")
-            except aiosqlite.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    raise e
     
     async def _extend_broadcasts_table(self, db: aiosqlite.Connection):
         """Расширить таблицу рассылок"""
@@ -265,47 +348,41 @@ class AdminMigrations:
             ("started_at", "TIMESTAMP"),
             ("error_message", "TEXT")
         ]
-        
+
+        existing_columns = await self._existing_columns(db, "broadcasts")
         for column_name, column_def in columns_to_add:
-            try:
+            if column_name not in existing_columns:
                 await db.execute(f"ALTER TABLE broadcasts ADD COLUMN {column_name} {column_def}")
-            except aiosqlite.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    raise e
 
     async def _add_status_to_broadcasts(self, db: aiosqlite.Connection):
         """Добавить колонку status в таблицу broadcasts"""
-        try:
-            await db.execute("ALTER TABLE broadcasts ADD COLUMN status TEXT DEFAULT 'pending'")
+        if "status" in await self._existing_columns(db, "broadcasts"):
+            return
 
-            # Обновляем существующие записи на основе поля completed
-            await db.execute("""
-                UPDATE broadcasts
-                SET status = CASE
-                    WHEN completed = 1 THEN 'completed'
-                    ELSE 'pending'
-                END
-            """)
+        await db.execute("ALTER TABLE broadcasts ADD COLUMN status TEXT DEFAULT 'pending'")
 
-        except aiosqlite.OperationalError as e:
-            if "duplicate column name" not in str(e).lower():
-                raise e
+        # Обновляем существующие записи на основе поля completed
+        await db.execute("""
+            UPDATE broadcasts
+            SET status = CASE
+                WHEN completed = 1 THEN 'completed'
+                ELSE 'pending'
+            END
+        """)
 
     async def _add_title_to_broadcasts(self, db: aiosqlite.Connection):
         """Добавить колонку title в таблицу broadcasts"""
-        try:
-            await db.execute("ALTER TABLE broadcasts ADD COLUMN title TEXT")
+        if "title" in await self._existing_columns(db, "broadcasts"):
+            return
 
-            # Обновляем существующие записи, создавая title на основе target_users
-            await db.execute("""
-                UPDATE broadcasts
-                SET title = 'Рассылка ' || COALESCE(target_users, 'all')
-                WHERE title IS NULL
-            """)
+        await db.execute("ALTER TABLE broadcasts ADD COLUMN title TEXT")
 
-        except aiosqlite.OperationalError as e:
-            if "duplicate column name" not in str(e).lower():
-                raise e
+        # Обновляем существующие записи, создавая title на основе target_users
+        await db.execute("""
+            UPDATE broadcasts
+            SET title = 'Рассылка ' || COALESCE(target_users, 'all')
+            WHERE title IS NULL
+        """)
 
     async def _insert_default_roles(self, db: aiosqlite.Connection):
         """Вставить роли по умолчанию"""
@@ -335,58 +412,44 @@ class AdminMigrations:
                 'description': 'Только просмотр данных'
             }
         ]
-        
-        for role in roles:
-            await db.execute("""
-                INSERT OR IGNORE INTO roles (name, display_name, permissions, description)
-                VALUES (?, ?, ?, ?)
-            """, (role['name'], role['display_name'], role['permissions'], role['description']))
+
+        await db.executemany("""
+            INSERT OR IGNORE INTO roles (name, display_name, permissions, description)
+            VALUES (?, ?, ?, ?)
+        """, [(role['name'], role['display_name'], role['permissions'], role['description']) for role in roles])
     
     async def _create_default_admin_user(self, db: aiosqlite.Connection):
         """Создать пользователя админа по умолчанию"""
-        from passlib.context import CryptContext
-        
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        
-        # Проверяем, есть ли уже админ пользователи
-        cursor = await db.execute("SELECT COUNT(*) FROM admin_users")
-        count = (await cursor.fetchone())[0]
-        
-        if count == 0:
-            # Создаем админа по умолчанию
-            default_password = "admin123"  # В production должен быть изменен
-            password_hash = pwd_context.hash(default_password)
-            
-            await db.execute("""
-                INSERT INTO admin_users (username, email, password_hash, role, is_active)
-                VALUES (?, ?, ?, ?, ?)
-            """, ("admin", "admin@localhost", password_hash, "super_admin", True))
-            
+        # Хеширование bcrypt дорогое, поэтому сначала дешево проверяем,
+        # нужен ли вообще админ по умолчанию
+        cursor = await db.execute("SELECT 1 FROM admin_users LIMIT 1")
+        if await cursor.fetchone():
+            return
+
+        default_password = "admin123"  # В production должен быть изменен
+        password_hash = _get_pwd_context().hash(default_password)
+
+        # NOT EXISTS повторно страхует от гонки с параллельным созданием админа
+        cursor = await db.execute("""
+            INSERT INTO admin_users (username, email, password_hash, role, is_active)
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM admin_users)
+            ON CONFLICT DO NOTHING
+        """, ("admin", "admin@localhost", password_hash, "super_admin", True))
+
+        if cursor.rowcount == 1:
             logger.warning(f"Создан админ пользователь по умолчанию: admin / {default_password}")
             logger.warning("ОБЯЗАТЕЛЬНО измените пароль после первого входа!")
 
     async def _add_telegram_user_roles(self, db: aiosqlite.Connection):
-        """Добавить поле role в таблицу users для Telegram пользователей"""
-        # Проверяем, существует ли уже поле role
-        cursor = await db.execute("PRAGMA table_info(users)")
-        columns = await cursor.fetchall()
-        column_names = [column[1] for column in columns]
-
-        if 'role' not in column_names:
-            # Добавляем поле role с значением по умолчанию 'user'
-            await db.execute("""
-                ALTER TABLE users
-                ADD COLUMN role TEXT DEFAULT 'user'
-            """)
-            logger.info("Добавлено поле role в таблицу users")
+        """Добавить индекс по полю role таблицы users для Telegram пользователей"""
+        # Само поле role добавляется в _extend_users_table
 
         # Создаем индекс для быстрого поиска по ролям
         await db.execute("""
             CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)
         """)
 
-        await db.commit()
-
     async def _assign_default_telegram_roles(self, db: aiosqlite.Connection):
         """Назначить роли конкретным Telegram пользователям"""
         # Определяем роли для конкретных пользователей
@@ -396,27 +459,14 @@ class AdminMigrations:
             792247608: 'admin'            # @fedor4fingers
         }
 
-        for user_id, role in user_roles.items():
-            # Проверяем, существует ли пользователь
-            cursor = await db.execute(
-                "SELECT user_id FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            user_exists = await cursor.fetchone()
-
-            if user_exists:
-                # Обновляем роль существующего пользователя
-                await db.execute("""
-                    UPDATE users
-                    SET role = ?
-                    WHERE user_id = ?
-                """, (role, user_id))
-                logger.info(f"Обновлена роль пользователя {user_id} на {role}")
-            else:
-                # Создаем пользователя с ролью (он будет создан при первом обращении к боту)
-                logger.info(f"Пользователь {user_id} будет создан с ролью {role} при первом обращении")
-
-        await db.commit()
+        # UPDATE без совпадений ничего не делает: отсутствующие пользователи
+        # получат роль при первом обращении к боту
+        await db.executemany("""
+            UPDATE users
+            SET role = ?
+            WHERE user_id = ?
+        """, [(role, user_id) for user_id, role in user_roles.items()])
+        logger.info(f"Назначены роли Telegram пользователям: {user_roles}")
 
 
 async def run_admin_migrations(db_path: str = "bot.db"):
@@ -2,29 +2,75 @@
 Система автоматических бэкапов для production-ready уровня
 """
 import asyncio
+import calendar
 import logging
 import os
 import shutil
 import gzip
 import json
+import re
+import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
-import schedule
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse, urlunparse
 import threading
-import time
 
 logger = logging.getLogger(__name__)
 
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    logger.warning("zstandard не установлен, бэкапы будут сжиматься gzip")
+
+# Размер буфера для копирования и (рас)паковки файлов бэкапов
+COPY_BUFFER_SIZE = 1 << 20
+
+# Расширения сжатых бэкапов: .gz остается для старых бэкапов и как fallback
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+# Логический бэкап PostgreSQL: pg_dump в custom формате (сжат самим pg_dump)
+PG_DUMP_SUFFIX = '.dump'
+
 
 class BackupSystem:
     """Система автоматических бэкапов"""
     
-    def __init__(self, db_path: str = "bot.db"):
-        self.db_path = db_path
+    # Расписание: задача -> (час, день недели или None, число месяца или None)
+    _SCHEDULE = {
+        'daily': (2, None, None),      # Ежедневные бэкапы в 2:00
+        'weekly': (3, 6, None),        # Еженедельные бэкапы по воскресеньям в 3:00
+        'monthly': (4, None, 1),       # Ежемесячные бэкапы 1 числа в 4:00
+        'cleanup': (5, None, None),    # Очистка старых бэкапов каждый день в 5:00
+    }
+    
+    # bot_backup_<тип>_<YYYYMMDD>_<HHMMSS>.db[.gz|.zst] или .dump (PostgreSQL)
+    _BACKUP_FILENAME_RE = re.compile(
+        r'^bot_backup_(?P<type>\w+?)_(?P<date>\d{8})_(?P<time>\d{6})'
+        r'(?:\.db(?P<ext>\.gz|\.zst)?|(?P<dump>\.dump))$'
+    )
+    
+    def __init__(self, db_path: Optional[str] = None, database_url: Optional[str] = None):
+        # Если задан PostgreSQL URL, бэкапится он (pg_dump), а не файл SQLite.
+        # DATABASE_URL из окружения берется только без явного db_path: переданный
+        # файл SQLite бэкапится как файл, даже если приложение работает на PostgreSQL
+        if database_url is None and db_path is None:
+            database_url = os.getenv('DATABASE_URL')
+        self.db_path = db_path or "bot.db"
+        self.database_url = database_url
         self.backup_dir = Path("backups")
         self.backup_dir.mkdir(exist_ok=True)
         
+        # Журнал метаданных бэкапов (JSON Lines, только дозапись): строка на каждый
+        # созданный бэкап и отметка {"name": ..., "deleted": true} на удаленный.
+        # В памяти держим индекс имя файла -> метаданные, собранный из журнала
+        self._log_path = self.backup_dir / 'backups.jsonl'
+        self._index: Optional[Dict[str, Dict]] = None
+        self._log_tombstones = 0
+        self._index_lock = threading.Lock()
+        
         # Настройки бэкапов
         self.daily_backups_keep = 7      # Дневные бэкапы хранить 7 дней
         self.weekly_backups_keep = 4     # Недельные бэкапы хранить 4 недели
@@ -33,6 +79,19 @@ class BackupSystem:
         # Сжатие бэкапов
         self.compress_backups = True
         
+        # PRAGMA integrity_check после копирования: копия через online backup API
+        # и так консистентна, проверка нужна только при подозрении на сбой носителя
+        self.verify_backups = False
+        
+        # Шаг online backup API: страниц за шаг и пауза между шагами (сек)
+        self.backup_pages_per_step = 1000
+        self.backup_step_sleep = 0.005
+        
+        # Утилиты PostgreSQL для логических бэкапов и степень сжатия custom формата
+        self.pg_dump_bin = 'pg_dump'
+        self.pg_restore_bin = 'pg_restore'
+        self.pg_dump_compress_level = 6
+        
         # Статистика
         self.backup_stats = {
             'total_backups': 0,
@@ -42,8 +101,13 @@ class BackupSystem:
             'last_error': None
         }
         
-        self._scheduler_thread = None
-        self._running = False
+        self._scheduler_task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+    
+    @property
+    def is_postgresql(self) -> bool:
+        """Бэкапится ли PostgreSQL база (иначе файл SQLite)"""
+        return bool(self.database_url) and self.database_url.startswith(('postgresql://', 'postgres://'))
     
     def create_backup_filename(self, backup_type: str = "manual") -> str:
         """Создать имя файла бэкапа"""
@@ -58,25 +122,22 @@ class BackupSystem:
         try:
             self.backup_stats['total_backups'] += 1
             
-            # Проверяем существование исходной базы
-            if not os.path.exists(self.db_path):
-                raise FileNotFoundError(f"База данных не найдена: {self.db_path}")
-            
             # Создаем имя файла
             backup_filename = self.create_backup_filename(backup_type)
             backup_path = self.backup_dir / backup_filename
             
-            # Копируем файл
-            shutil.copy2(self.db_path, backup_path)
-            
-            # Проверяем целостность
-            await self._verify_backup(backup_path)
-            
-            # Сжимаем если нужно
-            if compress:
-                compressed_path = await self._compress_backup(backup_path)
-                backup_path.unlink()  # Удаляем несжатый файл
-                backup_path = compressed_path
+            if self.is_postgresql:
+                # pg_dump выполняется отдельным процессом, event loop не блокируется
+                backup_path = await self._backup_postgresql(backup_path.with_suffix(PG_DUMP_SUFFIX), compress)
+            else:
+                # Проверяем существование исходной базы
+                if not os.path.exists(self.db_path):
+                    raise FileNotFoundError(f"База данных не найдена: {self.db_path}")
+                
+                # Снимаем консистентную копию через online backup API: она безопасна
+                # при параллельной записи, поэтому проверка выполняется только при verify_backups.
+                # Сжатие выполняется в том же потоке сразу после копирования
+                backup_path = await asyncio.to_thread(self._backup_database, backup_path, compress)
             
             # Обновляем статистику
             self.backup_stats['successful_backups'] += 1
@@ -94,48 +155,154 @@ class BackupSystem:
             logger.error(f"Ошибка создания бэкапа: {e}")
             return None
     
-    async def _verify_backup(self, backup_path: Path):
-        """Проверить целостность бэкапа"""
-        import sqlite3
+    def _pg_connection_args(self) -> Tuple[str, Dict[str, str]]:
+        """URL для утилит PostgreSQL без пароля и окружение с PGPASSWORD
+
+        Пароль не передается в командной строке, чтобы не светиться в списке процессов.
+        """
+        parsed = urlparse(self.database_url)
+        env = os.environ.copy()
+        
+        if parsed.password:
+            env['PGPASSWORD'] = unquote(parsed.password)
+            userinfo, _, hostinfo = parsed.netloc.rpartition('@')
+            parsed = parsed._replace(netloc=f"{userinfo.split(':', 1)[0]}@{hostinfo}")
+        
+        return urlunparse(parsed), env
+    
+    async def _run_pg_tool(self, *args: str):
+        """Запустить утилиту PostgreSQL и дождаться завершения"""
+        dsn, env = self._pg_connection_args()
+        proc = await asyncio.create_subprocess_exec(
+            *args, f"--dbname={dsn}",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env=env
+        )
+        _, stderr = await proc.communicate()
         
+        if proc.returncode != 0:
+            raise RuntimeError(f"{args[0]} завершился с кодом {proc.returncode}: {stderr.decode(errors='replace').strip()}")
+    
+    async def _backup_postgresql(self, backup_path: Path, compress: bool = True) -> Path:
+        """Логический бэкап PostgreSQL через pg_dump в custom формате"""
+        level = self.pg_dump_compress_level if compress else 0
         try:
-            conn = sqlite3.connect(str(backup_path))
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA integrity_check")
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result[0] != "ok":
-                raise Exception(f"Бэкап поврежден: {result[0]}")
-                
-        except Exception as e:
-            logger.error(f"Ошибка проверки бэкапа: {e}")
+            await self._run_pg_tool(self.pg_dump_bin, '-Fc', '-Z', str(level), '-f', str(backup_path))
+        except Exception:
+            backup_path.unlink(missing_ok=True)
             raise
+        return backup_path
     
-    async def _compress_backup(self, backup_path: Path) -> Path:
-        """Сжать бэкап"""
-        compressed_path = backup_path.with_suffix('.db.gz')
+    def _backup_database(self, backup_path: Path, compress: bool = False) -> Path:
+        """Скопировать базу через online backup API SQLite и при необходимости сжать"""
+        # Для сжатого бэкапа копия пишется во временный файл и сразу потоково
+        # упаковывается в .db.zst (или .db.gz, если zstandard не установлен)
+        copy_path = backup_path.with_suffix('.db.tmp') if compress else backup_path
+        
+        source_uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        src = sqlite3.connect(source_uri, uri=True)
+        try:
+            dst = sqlite3.connect(str(copy_path))
+            try:
+                # Крупные шаги с короткой паузой вместо стандартных 100 страниц / 250 мс
+                src.backup(dst, pages=self.backup_pages_per_step, sleep=self.backup_step_sleep)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        
+        if self.verify_backups:
+            # Проверяем несжатую копию, пока она еще на диске
+            result = self._integrity_check(copy_path)
+            if result != "ok":
+                copy_path.unlink(missing_ok=True)
+                raise Exception(f"Бэкап поврежден: {result}")
         
-        with open(backup_path, 'rb') as f_in:
-            with gzip.open(compressed_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        if not compress:
+            return backup_path
+        
+        try:
+            if ZSTD_AVAILABLE:
+                compressed_path = backup_path.with_suffix('.db.zst')
+                compressor = zstd.ZstdCompressor(level=3, threads=-1)
+                with open(copy_path, 'rb') as f_in, open(compressed_path, 'wb') as f_out:
+                    with compressor.stream_writer(f_out) as zst_out:
+                        shutil.copyfileobj(f_in, zst_out, length=COPY_BUFFER_SIZE)
+            else:
+                compressed_path = backup_path.with_suffix('.db.gz')
+                with open(copy_path, 'rb') as f_in, open(compressed_path, 'wb') as f_out:
+                    with gzip.GzipFile(fileobj=f_out, mode='wb', compresslevel=6) as gz_out:
+                        shutil.copyfileobj(f_in, gz_out, length=COPY_BUFFER_SIZE)
+        finally:
+            copy_path.unlink()
         
         logger.debug(f"Бэкап сжат: {compressed_path}")
         return compressed_path
     
+    def _open_compressed_backup(self, backup_path: Path):
+        """Открыть сжатый бэкап на чтение по его расширению"""
+        if backup_path.suffix == '.zst':
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("Для восстановления .zst бэкапа требуется пакет zstandard")
+            return zstd.ZstdDecompressor().stream_reader(open(backup_path, 'rb'), closefd=True)
+        return gzip.open(backup_path, 'rb')
+    
+    def _integrity_check(self, backup_path: Path) -> str:
+        """Выполнить PRAGMA integrity_check для файла базы"""
+        conn = sqlite3.connect(str(backup_path))
+        try:
+            return conn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            conn.close()
+    
+    async def _verify_backup(self, backup_path: Path):
+        """Проверить целостность бэкапа"""
+        try:
+            result = await asyncio.to_thread(self._integrity_check, backup_path)
+            
+            if result != "ok":
+                raise Exception(f"Бэкап поврежден: {result}")
+                
+        except Exception as e:
+            logger.error(f"Ошибка проверки бэкапа: {e}")
+            raise
+    
     async def _save_backup_metadata(self, backup_path: Path, backup_type: str):
         """Сохранить метаданные бэкапа"""
+        await asyncio.to_thread(self._write_backup_metadata, backup_path, backup_type)
+    
+    def _write_backup_metadata(self, backup_path: Path, backup_type: str):
+        """Дописать метаданные бэкапа в журнал и добавить бэкап в индекс"""
         metadata = {
-            'backup_type': backup_type,
+            'path': str(backup_path),
+            'name': backup_path.name,
+            'size': backup_path.stat().st_size,
             'created_at': datetime.now().isoformat(),
-            'original_db_path': self.db_path,
-            'file_size': backup_path.stat().st_size,
-            'compressed': backup_path.suffix == '.gz'
+            'backup_type': backup_type,
+            'compressed': backup_path.suffix in COMPRESSED_SUFFIXES or backup_path.suffix == PG_DUMP_SUFFIX,
+            'database': 'postgresql' if backup_path.suffix == PG_DUMP_SUFFIX else 'sqlite',
+            'original_db_path': self.db_path
         }
         
-        metadata_path = backup_path.with_suffix('.json')
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        with self._index_lock:
+            index = self._get_index()
+            index[backup_path.name] = metadata
+            self._append_log([metadata])
+    
+    def _restore_file(self, backup_path: Path, target_path: str):
+        """Распаковать или скопировать файл бэкапа в целевой путь"""
+        if backup_path.suffix in COMPRESSED_SUFFIXES:
+            # Распаковываем сжатый бэкап в один заранее выделенный буфер
+            buffer = bytearray(COPY_BUFFER_SIZE)
+            view = memoryview(buffer)
+            with self._open_compressed_backup(backup_path) as f_in:
+                with open(target_path, 'wb') as f_out:
+                    while (read_size := f_in.readinto(buffer)):
+                        f_out.write(view[:read_size])
+        else:
+            # Копируем обычный бэкап
+            shutil.copy2(backup_path, target_path)
     
     async def restore_backup(self, backup_path: str, target_path: Optional[str] = None) -> bool:
         """Восстановить базу данных из бэкапа"""
@@ -148,20 +315,16 @@ class BackupSystem:
             if not backup_path.exists():
                 raise FileNotFoundError(f"Бэкап не найден: {backup_path}")
             
+            if backup_path.suffix == PG_DUMP_SUFFIX:
+                return await self._restore_postgresql(backup_path)
+            
             # Создаем бэкап текущей базы перед восстановлением
             if os.path.exists(target_path):
                 current_backup = await self.create_backup("pre_restore")
                 logger.info(f"Создан бэкап текущей БД: {current_backup}")
             
-            # Восстанавливаем
-            if backup_path.suffix == '.gz':
-                # Распаковываем сжатый бэкап
-                with gzip.open(backup_path, 'rb') as f_in:
-                    with open(target_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-            else:
-                # Копируем обычный бэкап
-                shutil.copy2(backup_path, target_path)
+            # Восстанавливаем в отдельном потоке, не блокируя event loop
+            await asyncio.to_thread(self._restore_file, backup_path, target_path)
             
             # Проверяем восстановленную базу
             await self._verify_backup(Path(target_path))
@@ -173,144 +336,280 @@ class BackupSystem:
             logger.error(f"Ошибка восстановления из бэкапа: {e}")
             return False
     
-    def cleanup_old_backups(self):
-        """Очистка старых бэкапов по политике хранения"""
-        now = datetime.now()
+    async def _restore_postgresql(self, backup_path: Path) -> bool:
+        """Восстановить PostgreSQL из дампа pg_dump через pg_restore"""
+        if not self.is_postgresql:
+            raise RuntimeError("Для восстановления дампа PostgreSQL требуется DATABASE_URL")
+        
+        # Создаем бэкап текущей базы перед восстановлением
+        current_backup = await self.create_backup("pre_restore")
+        logger.info(f"Создан бэкап текущей БД: {current_backup}")
+        
+        await self._run_pg_tool(self.pg_restore_bin, '--clean', '--if-exists', '--no-owner', str(backup_path))
         
-        # Получаем все бэкапы
-        backups = []
-        for backup_file in self.backup_dir.glob("bot_backup_*.db*"):
-            if backup_file.suffix in ['.db', '.gz']:
+        logger.info(f"База данных восстановлена из бэкапа: {backup_path}")
+        return True
+    
+    def _get_index(self) -> Dict[str, Dict]:
+        """Получить индекс бэкапов, при первом обращении прочитав журнал с диска"""
+        if self._index is None:
+            try:
+                self._index = self._replay_log()
+            except FileNotFoundError:
+                # Холодный старт: строим индекс сканированием каталога
+                # (старые бэкапы с отдельными .json метаданными и index.json)
+                self._index = self._scan_backups()
+                self._rewrite_log()
+                (self.backup_dir / 'index.json').unlink(missing_ok=True)
+        return self._index
+    
+    def _replay_log(self) -> Dict[str, Dict]:
+        """Собрать индекс из журнала за одно чтение файла"""
+        index = {}
+        self._log_tombstones = 0
+        
+        with open(self._log_path, 'r', encoding='utf-8') as f:
+            for line in f:
                 try:
-                    # Извлекаем дату из имени файла
-                    parts = backup_file.stem.split('_')
-                    if len(parts) >= 4:
-                        date_str = parts[3]  # YYYYMMDD
-                        time_str = parts[4] if len(parts) > 4 else "000000"  # HHMMSS
-                        backup_date = datetime.strptime(f"{date_str}_{time_str}", "%Y%m%d_%H%M%S")
-                        
-                        backups.append({
-                            'path': backup_file,
-                            'date': backup_date,
-                            'type': parts[2] if len(parts) > 2 else 'manual'
-                        })
-                except:
-                    continue
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Недописанная строка после сбоя
+                
+                if record.get('deleted'):
+                    index.pop(record['name'], None)
+                    self._log_tombstones += 1
+                else:
+                    index[record['name']] = record
         
-        # Сортируем по дате
-        backups.sort(key=lambda x: x['date'], reverse=True)
+        return index
+    
+    @staticmethod
+    def _log_lines(records) -> str:
+        """Сериализовать записи журнала: компактный JSON, по строке на запись"""
+        return ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records)
+    
+    def _append_log(self, records: List[Dict]):
+        """Дописать записи в журнал одной операцией записи"""
+        with open(self._log_path, 'a', encoding='utf-8') as f:
+            f.write(self._log_lines(records))
+    
+    def _rewrite_log(self):
+        """Атомарно переписать журнал текущим состоянием индекса (сжатие отметок удаления)"""
+        tmp_path = self._log_path.with_suffix('.jsonl.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self._log_lines(self._index.values()))
+        os.replace(tmp_path, self._log_path)
+        self._log_tombstones = 0
+    
+    def _scan_backups(self) -> Dict[str, Dict]:
+        """Собрать индекс по файлам бэкапов и их метаданным"""
+        index = {}
+        
+        # Один проход scandir: и бэкапы, и файлы метаданных
+        entries = {entry.name: entry for entry in os.scandir(self.backup_dir) if entry.is_file()}
+        
+        for name, entry in entries.items():
+            match = self._BACKUP_FILENAME_RE.match(name)
+            if not match:
+                continue
+            
+            try:
+                metadata_name = Path(name).with_suffix('.json').name
+                metadata = {}
+                
+                if metadata_name in entries:
+                    with open(entries[metadata_name].path, 'r', encoding='utf-8') as f:
+                        metadata = json.load(f)
+                
+                # Без метаданных дату и тип берем из имени файла
+                created_at = metadata.get('created_at')
+                if created_at is None:
+                    date_str, time_str = match.group('date'), match.group('time')
+                    created_at = datetime(
+                        int(date_str[:4]), int(date_str[4:6]), int(date_str[6:]),
+                        int(time_str[:2]), int(time_str[2:4]), int(time_str[4:])
+                    ).isoformat()
+                
+                index[name] = {
+                    'path': str(self.backup_dir / name),
+                    'name': name,
+                    'size': entry.stat().st_size,
+                    'created_at': created_at,
+                    'backup_type': metadata.get('backup_type', match.group('type')),
+                    'compressed': metadata.get(
+                        'compressed', match.group('ext') is not None or match.group('dump') is not None
+                    )
+                }
+            except Exception:
+                continue
+        
+        return index
+    
+    def cleanup_old_backups(self):
+        """Очистка старых бэкапов по политике хранения"""
+        now = datetime.now()
         
         # Применяем политику хранения
         daily_cutoff = now - timedelta(days=self.daily_backups_keep)
         weekly_cutoff = now - timedelta(weeks=self.weekly_backups_keep)
         monthly_cutoff = now - timedelta(days=30 * self.monthly_backups_keep)
         
-        for backup in backups:
-            should_delete = False
-            
-            if backup['type'] == 'daily' and backup['date'] < daily_cutoff:
-                should_delete = True
-            elif backup['type'] == 'weekly' and backup['date'] < weekly_cutoff:
-                should_delete = True
-            elif backup['type'] == 'monthly' and backup['date'] < monthly_cutoff:
-                should_delete = True
-            elif backup['type'] == 'manual' and backup['date'] < monthly_cutoff:
-                # Ручные бэкапы храним как месячные
-                should_delete = True
+        with self._index_lock:
+            index = self._get_index()
+            deleted = []
+            failed = []
             
-            if should_delete:
+            for name, backup in list(index.items()):
                 try:
-                    backup['path'].unlink()
-                    # Удаляем метаданные если есть
-                    metadata_path = backup['path'].with_suffix('.json')
-                    if metadata_path.exists():
-                        metadata_path.unlink()
-                    
-                    logger.info(f"Удален старый бэкап: {backup['path']}")
-                except Exception as e:
-                    logger.error(f"Ошибка удаления бэкапа {backup['path']}: {e}")
+                    backup_date = datetime.fromisoformat(backup['created_at'])
+                except ValueError:
+                    continue
+                
+                should_delete = False
+                
+                if backup['backup_type'] == 'daily' and backup_date < daily_cutoff:
+                    should_delete = True
+                elif backup['backup_type'] == 'weekly' and backup_date < weekly_cutoff:
+                    should_delete = True
+                elif backup['backup_type'] == 'monthly' and backup_date < monthly_cutoff:
+                    should_delete = True
+                elif backup['backup_type'] == 'manual' and backup_date < monthly_cutoff:
+                    # Ручные бэкапы храним как месячные
+                    should_delete = True
+                
+                if should_delete:
+                    backup_path = backup['path']
+                    try:
+                        # Сам бэкап и его файл метаданных (.json рядом с ним у старых бэкапов),
+                        # отсутствующий файл не ошибка - без лишнего stat
+                        for path in (backup_path, os.path.splitext(backup_path)[0] + '.json'):
+                            try:
+                                os.unlink(path)
+                            except FileNotFoundError:
+                                pass
+                        
+                        del index[name]
+                        deleted.append(name)
+                    except OSError as e:
+                        failed.append(f"{name}: {e}")
+            
+            if deleted:
+                self._append_log([{'name': name, 'deleted': True} for name in deleted])
+                self._log_tombstones += len(deleted)
+                
+                # Когда отметок удаления больше живых записей, переписываем журнал
+                if self._log_tombstones > len(index):
+                    self._rewrite_log()
+        
+        if deleted:
+            logger.info(f"Удалено старых бэкапов: {len(deleted)} ({', '.join(deleted)})")
+        if failed:
+            logger.error(f"Не удалось удалить бэкапы ({len(failed)}): {'; '.join(failed)}")
     
     def get_backup_list(self) -> List[Dict]:
         """Получить список всех бэкапов"""
-        backups = []
-        
-        for backup_file in self.backup_dir.glob("bot_backup_*.db*"):
-            if backup_file.suffix in ['.db', '.gz']:
-                try:
-                    metadata_path = backup_file.with_suffix('.json')
-                    metadata = {}
-                    
-                    if metadata_path.exists():
-                        with open(metadata_path, 'r', encoding='utf-8') as f:
-                            metadata = json.load(f)
-                    
-                    backups.append({
-                        'path': str(backup_file),
-                        'name': backup_file.name,
-                        'size': backup_file.stat().st_size,
-                        'created_at': metadata.get('created_at', 'Unknown'),
-                        'backup_type': metadata.get('backup_type', 'Unknown'),
-                        'compressed': metadata.get('compressed', backup_file.suffix == '.gz')
-                    })
-                except:
-                    continue
+        with self._index_lock:
+            backups = list(self._get_index().values())
         
         # Сортируем по дате создания
         backups.sort(key=lambda x: x['created_at'], reverse=True)
         return backups
     
     def start_scheduler(self):
-        """Запустить планировщик автоматических бэкапов"""
-        if self._running:
-            return
-
-        # Останавливаем предыдущий поток если он существует
-        if self._scheduler_thread and self._scheduler_thread.is_alive():
-            self.stop_scheduler()
-            time.sleep(1)  # Даем время на остановку
-
-        # Настраиваем расписание
-        schedule.clear()
-
-        # Ежедневные бэкапы в 2:00
-        schedule.every().day.at("02:00").do(self._scheduled_backup, "daily")
+        """Запустить планировщик автоматических бэкапов в event loop приложения"""
+        if self._scheduler_task and not self._scheduler_task.done():
+            return  # Уже запущен
 
-        # Еженедельные бэкапы по воскресеньям в 3:00
-        schedule.every().sunday.at("03:00").do(self._scheduled_backup, "weekly")
-
-        # Ежемесячные бэкапы 1 числа в 4:00
-        schedule.every().month.do(self._scheduled_backup, "monthly")
-
-        # Очистка старых бэкапов каждый день в 5:00
-        schedule.every().day.at("05:00").do(self.cleanup_old_backups)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.error("Планировщик бэкапов должен запускаться из работающего event loop")
+            return
 
-        self._running = True
-        self._scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self._scheduler_thread.start()
+        self._stop_event = asyncio.Event()
+        self._scheduler_task = loop.create_task(self._run_scheduler(self._stop_event))
 
         logger.info("Планировщик автоматических бэкапов запущен")
     
     def stop_scheduler(self):
-        """Остановить планировщик"""
-        self._running = False
-        schedule.clear()
+        """Остановить планировщик
+
+        Ожидание следующей задачи прерывается сразу, а уже идущий бэкап
+        дописывается до конца, а не отменяется посередине.
+        """
+        if self._stop_event:
+            self._stop_event.set()
+        self._stop_event = None
+        self._scheduler_task = None
         logger.info("Планировщик автоматических бэкапов остановлен")
     
-    def _run_scheduler(self):
-        """Запуск планировщика в отдельном потоке"""
-        while self._running:
-            schedule.run_pending()
-            time.sleep(60)  # Проверяем каждую минуту
+    @staticmethod
+    def _next_run_time(now: datetime, hour: int, weekday: Optional[int] = None,
+                       day: Optional[int] = None) -> datetime:
+        """Ближайший момент запуска строго после now по часу, дню недели или числу месяца
+
+        Число больше длины месяца (например, 31) переносится на последний день месяца.
+        """
+        run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        
+        if day is not None:
+            year, month = run.year, run.month
+            while True:
+                last_day = calendar.monthrange(year, month)[1]
+                run = run.replace(year=year, month=month, day=min(day, last_day))
+                if run > now:
+                    return run
+                # Тот же день следующего месяца
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        
+        if weekday is not None:
+            run += timedelta(days=(weekday - run.weekday()) % 7)
+            if run <= now:
+                run += timedelta(days=7)
+            return run
+        
+        if run <= now:
+            run += timedelta(days=1)
+        return run
     
-    def _scheduled_backup(self, backup_type: str):
-        """Создать запланированный бэкап"""
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.create_backup(backup_type))
-            loop.close()
-        except Exception as e:
-            logger.error(f"Ошибка запланированного бэкапа {backup_type}: {e}")
+    def _next_job(self, now: datetime, last_runs: Dict[str, datetime]) -> Tuple[datetime, str]:
+        """Ближайшая задача расписания и время ее запуска
+
+        Следующий запуск задачи - строго после ее предыдущего run_at: таймер
+        event loop идет по монотонным часам и может сработать чуть раньше
+        run_at по настенным, тогда тот же запуск не выполняется второй раз.
+        """
+        return min(
+            (self._next_run_time(max(now, last_runs.get(job, now)), hour, weekday, day), job)
+            for job, (hour, weekday, day) in self._SCHEDULE.items()
+        )
+    
+    async def _run_scheduler(self, stop_event: asyncio.Event):
+        """Цикл планировщика: ждем ровно до следующей задачи или до сигнала остановки"""
+        last_runs: Dict[str, datetime] = {}
+        while not stop_event.is_set():
+            try:
+                run_at, job = self._next_job(datetime.now(), last_runs)
+                delay = max((run_at - datetime.now()).total_seconds(), 0)
+                
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                    break  # Получен сигнал остановки
+                except asyncio.TimeoutError:
+                    pass
+                
+                # Запоминаем до выполнения: после ошибки запуск не повторяется
+                last_runs[job] = run_at
+                if job == 'cleanup':
+                    await asyncio.to_thread(self.cleanup_old_backups)
+                else:
+                    await self.create_backup(job)
+                    
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике бэкапов: {e}")
+                await asyncio.sleep(60)  # Ждем минуту при ошибке
     
     def get_stats(self) -> Dict:
         """Получить статистику бэкапов"""
@@ -3,42 +3,205 @@ PostgreSQL адаптер базы данных
 """
 import os
 import asyncio
+import contextlib
+import contextvars
+import functools
+import json
 import logging
-from typing import Optional, List, Dict, Any, Union
+import re
+from typing import Optional, List, Dict, Any, Tuple, Union
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# Замены SQLite специфичных функций
+_PG_REPLACEMENTS = {
+    'datetime(\'now\')': 'NOW()',
+    'datetime(\'now\', \'-30 days\')': 'NOW() - INTERVAL \'30 days\'',
+    'DATE(created_at)': 'DATE(created_at)',
+    'PRAGMA table_info': 'SELECT column_name FROM information_schema.columns WHERE table_name =',
+    'sqlite_master': 'information_schema.tables',
+}
+# Все замены за один проход; более длинные шаблоны первыми, чтобы префикс не перехватил совпадение
+_PG_REPLACEMENTS_RE = re.compile(
+    '|'.join(re.escape(k) for k in sorted(_PG_REPLACEMENTS, key=len, reverse=True))
+)
+
+# Открытая транзакция текущей задачи: (адаптер, соединение, блокировка соединения).
+# Задачи, порожденные внутри блока (asyncio.gather), наследуют ее через контекст
+_current_tx: contextvars.ContextVar = contextvars.ContextVar('db_adapter_tx', default=None)
+
+# Интервал опроса pg_try_advisory_lock при ожидании advisory-блокировки, секунды
+_ADVISORY_LOCK_POLL_INTERVAL = 0.2
+
+
+@functools.lru_cache(maxsize=1024)
+def convert_query_to_pg(query: str) -> str:
+    """Конвертировать SQLite запрос в PostgreSQL формат (с кэшированием по тексту запроса)"""
+    # Заменяем ? на $1, $2, etc за один проход
+    parts = query.split('?')
+    pg_query = ''.join(f'{part}${i}' for i, part in enumerate(parts[:-1], 1)) + parts[-1]
+    
+    return _PG_REPLACEMENTS_RE.sub(lambda m: _PG_REPLACEMENTS[m.group(0)], pg_query)
+
+
+def as_dict(row: Optional[Any]) -> Optional[Dict]:
+    """Преобразовать запись asyncpg.Record в словарь (для кода, которому нужен изменяемый dict)"""
+    return dict(row) if row is not None else None
+
+
+def as_dicts(rows: Optional[List[Any]]) -> List[Dict]:
+    """Преобразовать список записей asyncpg.Record в список словарей"""
+    return [dict(row) for row in rows] if rows else []
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    """Сериализовать значение в бинарный JSONB (байт версии 1 + текст JSON)
+
+    Любое значение, включая str, сериализуется через json.dumps: строка сохраняется
+    как JSON-строка, а не разбирается как готовый JSON.
+    """
+    return b'\x01' + json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    """Разобрать бинарный JSONB (пропуская байт версии)"""
+    return json.loads(data[1:])
+
+
+async def _init_connection(conn) -> None:
+    """Настройка нового соединения пула: JSONB передается как dict/list без ручного json.dumps
+
+    Бинарный формат кодека нужен и для copy_records_to_table.
+    """
+    await conn.set_type_codec(
+        'jsonb', encoder=_encode_jsonb, decoder=_decode_jsonb,
+        schema='pg_catalog', format='binary'
+    )
+
+
+# Схема PostgreSQL: собирается один раз при импорте модуля. Первой идет users -
+# на нее ссылаются внешние ключи остальных таблиц
+_PG_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        created_at TIMESTAMP DEFAULT NOW(),
+        requests_used INTEGER DEFAULT 0,
+        is_subscribed BOOLEAN DEFAULT FALSE,
+        subscription_end TIMESTAMP,
+        last_request TIMESTAMP,
+        last_payment_date TIMESTAMP,
+        payment_provider TEXT,
+        role TEXT DEFAULT 'user',
+        unlimited_access BOOLEAN DEFAULT FALSE,
+        blocked BOOLEAN DEFAULT FALSE,
+        bot_blocked BOOLEAN DEFAULT FALSE,
+        blocked_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS requests (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT,
+        channels_input TEXT,
+        results JSONB,
+        created_at TIMESTAMP DEFAULT NOW(),
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT,
+        payment_id TEXT UNIQUE,
+        provider_payment_id TEXT,
+        amount INTEGER,
+        currency TEXT DEFAULT 'RUB',
+        status TEXT DEFAULT 'pending',
+        invoice_payload TEXT,
+        subscription_months INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT NOW(),
+        completed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """
+)
+
+_PG_INDEXES = (
+    # Вторичные индексы под фильтры в обработчиках
+    "CREATE INDEX IF NOT EXISTS idx_requests_user_created ON requests(user_id, created_at DESC)",
+    # Запросы за период по всем пользователям (статистика за сегодня)
+    "CREATE INDEX IF NOT EXISTS idx_requests_created_at ON requests(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_user_status ON payments(user_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_status_created ON payments(status, created_at)",
+    # Частичный индекс: только подписчики, для выборки истекающих подписок
+    "CREATE INDEX IF NOT EXISTS idx_users_subscription_end ON users(subscription_end) WHERE is_subscribed",
+    "CREATE INDEX IF NOT EXISTS idx_users_last_request ON users(last_request)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_results_gin ON requests USING GIN (results jsonb_path_ops)"
+)
+
+
 class DatabaseAdapter:
     """Production-ready PostgreSQL адаптер с connection pooling"""
 
     def __init__(self, database_url: str):
         self.database_url = database_url
         self.db_type = 'postgresql'  # Только PostgreSQL
-        self.connection = None
         self.connection_pool = None
         self._connection_retries = 3
         self._connection_timeout = 30
+        self._pool_min_size = 2
+        self._pool_max_size = 10
+        # Подготовленные запросы кэширует сам asyncpg в каждом соединении пула:
+        # повторный execute/fetch с тем же текстом запроса пропускает parse/plan.
+        # Текст стабилен благодаря кэшу convert_query_to_pg
+        self._statement_cache_size = 1024
+        # Общий адаптер приложения: пул живет до close(), а disconnect() после
+        # отдельного запроса его не закрывает (иначе рвутся запросы других обработчиков)
+        self.keep_pool_open = False
+        # Параметры сессии PostgreSQL для всех соединений пула (SET при подключении).
+        # Нужны отдельным пулам со своим профилем нагрузки, например миграциям
+        self.server_settings: Dict[str, str] = {}
 
         if not (database_url.startswith('postgresql://') or database_url.startswith('postgres://')):
             raise ValueError("Поддерживается только PostgreSQL. DATABASE_URL должен начинаться с 'postgresql://' или 'postgres://'")
 
         logger.debug(f"Инициализирован PostgreSQL адаптер")
 
+    @property
+    def is_connected(self) -> bool:
+        """Открыт ли пул соединений"""
+        return self.connection_pool is not None and not self.connection_pool.is_closing()
+
+    @property
+    def in_transaction(self) -> bool:
+        """Идут ли запросы адаптера сейчас внутри transaction()"""
+        tx = _current_tx.get()
+        return tx is not None and tx[0] is self
+
     async def connect(self):
-        """Установить соединение с PostgreSQL с retry логикой"""
+        """Создать пул соединений с PostgreSQL с retry логикой"""
         import asyncpg
 
         for attempt in range(self._connection_retries):
             try:
-                if self.connection and not self.connection.is_closed():
-                    return  # Соединение уже активно
+                if self.is_connected:
+                    return  # Пул уже активен
 
-                self.connection = await asyncpg.connect(
+                self.connection_pool = await asyncpg.create_pool(
                     self.database_url,
-                    command_timeout=self._connection_timeout
+                    min_size=self._pool_min_size,
+                    max_size=self._pool_max_size,
+                    command_timeout=self._connection_timeout,
+                    statement_cache_size=self._statement_cache_size,
+                    server_settings=self.server_settings or None,
+                    init=_init_connection
                 )
-                logger.debug(f"✅ PostgreSQL соединение установлено (попытка {attempt + 1})")
+                logger.debug(f"✅ Пул соединений PostgreSQL создан (попытка {attempt + 1})")
                 return
 
             except Exception as e:
@@ -49,180 +212,241 @@ class DatabaseAdapter:
                 await asyncio.sleep(1)  # Пауза перед повторной попыткой
 
     async def disconnect(self):
-        """Закрыть соединение с базой данных"""
+        """Закрыть пул соединений с базой данных (для общего адаптера - только через close())"""
+        if self.keep_pool_open:
+            return
+        await self.close()
+
+    async def close(self):
+        """Закрыть пул соединений независимо от keep_pool_open"""
         try:
-            if self.connection and not self.connection.is_closed():
-                await self.connection.close()
-                logger.debug("✅ PostgreSQL соединение закрыто")
+            if self.is_connected:
+                await self.connection_pool.close()
+                logger.debug("✅ Пул соединений PostgreSQL закрыт")
         except Exception as e:
-            logger.warning(f"⚠️ Ошибка при закрытии соединения: {e}")
+            logger.warning(f"⚠️ Ошибка при закрытии пула соединений: {e}")
         finally:
-            self.connection = None
+            self.connection_pool = None
             
-    async def _ensure_connection(self):
-        """Убедиться, что соединение активно"""
-        if not self.connection or self.connection.is_closed():
-            await self.connect()
+    async def warm(self, n: Optional[int] = None):
+        """Прогреть пул: заранее открыть n соединений (по умолчанию max_size)
 
-    async def execute(self, query: str, params: tuple = None) -> Any:
-        """Выполнить SQL запрос в PostgreSQL с автоматическим переподключением"""
-        await self._ensure_connection()
+        Соединения захватываются одновременно, поэтому каждое из них - отдельное
+        и проходит handshake сейчас, а не на первых запросах пользователей.
+        """
+        await self.connect()
+        n = min(n or self._pool_max_size, self._pool_max_size)
 
+        results = await asyncio.gather(
+            *(self.connection_pool.acquire() for _ in range(n)), return_exceptions=True
+        )
+        conns = [conn for conn in results if not isinstance(conn, BaseException)]
         try:
+            await asyncio.gather(*(conn.fetchval("SELECT 1") for conn in conns))
+        finally:
+            await asyncio.gather(*(self.connection_pool.release(conn) for conn in conns))
+
+        logger.debug(f"✅ Пул соединений прогрет: {len(conns)} из {n}")
+
+    async def _ensure_pool(self):
+        """Пул соединений; если он не открыт или уже закрыт - переподключиться"""
+        if not self.is_connected:
+            await self.connect()
+        return self.connection_pool
+
+    @contextlib.asynccontextmanager
+    async def _acquire(self, cache: bool = True):
+        """Соединение из пула; cache=False - без кэшированного generic-плана
+
+        После нескольких выполнений PostgreSQL может перейти для подготовленного
+        запроса на generic-план, который для перекошенных данных бывает на порядки
+        медленнее. При cache=False запрос выполняется в транзакции с
+        SET LOCAL plan_cache_mode = force_custom_plan: план строится под
+        конкретные параметры, а настройка не переживает транзакцию.
+        """
+        tx = _current_tx.get()
+        if tx is not None and tx[0] is self:
+            # Внутри transaction() - на соединении транзакции, по одному запросу за раз.
+            # plan_cache_mode здесь не трогаем: SET LOCAL действовал бы до конца всей транзакции
+            _, conn, lock = tx
+            async with lock:
+                yield conn
+            return
+
+        pool = await self._ensure_pool()
+
+        async with pool.acquire() as conn:
+            if cache:
+                yield conn
+            else:
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL plan_cache_mode = force_custom_plan")
+                    yield conn
+
+    async def execute(self, query: str, params: tuple = None, cache: bool = True) -> Any:
+        """Выполнить SQL запрос в PostgreSQL на соединении из пула
+
+        cache=False - для аналитических запросов (агрегаты статистики по диапазонам
+        дат, CTE), где generic-план оказывается неудачным.
+        """
+        async with self._acquire(cache) as conn:
             if params:
                 # Конвертируем ? в $1, $2, etc для PostgreSQL
-                pg_query = self._convert_query_to_pg(query)
-                return await self.connection.execute(pg_query, *params)
-            else:
-                return await self.connection.execute(query)
-        except Exception as e:
-            if "connection" in str(e).lower() or "closed" in str(e).lower():
-                logger.warning(f"⚠️ Соединение потеряно, переподключаемся: {e}")
-                await self.connect()
-                # Повторяем запрос
-                if params:
-                    pg_query = self._convert_query_to_pg(query)
-                    return await self.connection.execute(pg_query, *params)
-                else:
-                    return await self.connection.execute(query)
-            raise
+                return await conn.execute(self._convert_query_to_pg(query), *params)
+            return await conn.execute(query)
     
-    async def fetch_one(self, query: str, params: tuple = None) -> Optional[Dict]:
-        """Получить одну запись из PostgreSQL с автоматическим переподключением"""
-        await self._ensure_connection()
+    async def fetch_one(self, query: str, params: tuple = None, cache: bool = True) -> Optional[Any]:
+        """Получить одну запись из PostgreSQL на соединении из пула
 
-        try:
+        Возвращает asyncpg.Record без копирования в dict: доступ по ключу, индексу,
+        .get() и .items() поддерживается. Если нужен изменяемый словарь - as_dict().
+        cache=False - см. execute().
+        """
+        async with self._acquire(cache) as conn:
             if params:
-                pg_query = self._convert_query_to_pg(query)
-                row = await self.connection.fetchrow(pg_query, *params)
+                row = await conn.fetchrow(self._convert_query_to_pg(query), *params)
             else:
-                row = await self.connection.fetchrow(query)
-            return dict(row) if row else None
-        except Exception as e:
-            if "connection" in str(e).lower() or "closed" in str(e).lower():
-                logger.warning(f"⚠️ Соединение потеряно при fetch_one, переподключаемся: {e}")
-                await self.connect()
-                # Повторяем запрос
-                if params:
-                    pg_query = self._convert_query_to_pg(query)
-                    row = await self.connection.fetchrow(pg_query, *params)
-                else:
-                    row = await self.connection.fetchrow(query)
-                return dict(row) if row else None
-            raise
-
-    async def fetch_all(self, query: str, params: tuple = None) -> List[Dict]:
-        """Получить все записи из PostgreSQL с автоматическим переподключением"""
-        await self._ensure_connection()
+                row = await conn.fetchrow(query)
+        return row
 
-        try:
+    async def fetch_all(self, query: str, params: tuple = None, cache: bool = True) -> List[Any]:
+        """Получить все записи из PostgreSQL на соединении из пула
+
+        Возвращает список asyncpg.Record без материализации словарей.
+        Если нужны изменяемые словари - as_dicts(). cache=False - см. execute().
+        """
+        async with self._acquire(cache) as conn:
             if params:
-                pg_query = self._convert_query_to_pg(query)
-                rows = await self.connection.fetch(pg_query, *params)
+                rows = await conn.fetch(self._convert_query_to_pg(query), *params)
             else:
-                rows = await self.connection.fetch(query)
-            return [dict(row) for row in rows]
-        except Exception as e:
-            if "connection" in str(e).lower() or "closed" in str(e).lower():
-                logger.warning(f"⚠️ Соединение потеряно при fetch_all, переподключаемся: {e}")
-                await self.connect()
-                # Повторяем запрос
-                if params:
-                    pg_query = self._convert_query_to_pg(query)
-                    rows = await self.connection.fetch(pg_query, *params)
-                else:
-                    rows = await self.connection.fetch(query)
-                return [dict(row) for row in rows]
-            raise
+                rows = await conn.fetch(query)
+        return rows
+
+    async def fetch_val(self, query: str, params: tuple = None, column: int = 0, cache: bool = True) -> Any:
+        """Получить одно значение первой строки из PostgreSQL (None, если строк нет)
+
+        Для проверок вида "роль пользователя", "активна ли подписка", COUNT(*):
+        значение приходит без записи и без dict. cache=False - см. execute().
+        """
+        async with self._acquire(cache) as conn:
+            if params:
+                return await conn.fetchval(self._convert_query_to_pg(query), *params, column=column)
+            return await conn.fetchval(query, column=column)
+
+    async def execute_many(self, query: str, params_seq: List[tuple]) -> None:
+        """Выполнить один SQL запрос для набора параметров за один проход (executemany)"""
+        if not params_seq:
+            return
+
+        async with self._acquire() as conn:
+            await conn.executemany(self._convert_query_to_pg(query), params_seq)
+
+    async def copy_records(self, table: str, records: List[tuple], columns: List[str]) -> str:
+        """Массовая вставка записей через COPY (для больших пакетов)"""
+        if not records:
+            return 'COPY 0'
+
+        async with self._acquire() as conn:
+            return await conn.copy_records_to_table(table, records=records, columns=columns)
     
+    @contextlib.asynccontextmanager
+    async def prepare(self, query: str):
+        """Подготовленный запрос на соединении, удерживаемом из пула на время блока
+
+        Для циклов по многим параметрам: stmt.fetchval/fetchrow/fetch вызываются
+        без повторного разбора и без преобразования строк в dict.
+
+            async with adapter.prepare("SELECT role FROM users WHERE user_id = ?") as stmt:
+                roles = [await stmt.fetchval(user_id) for user_id in user_ids]
+        """
+        async with self._acquire() as conn:
+            yield await conn.prepare(self._convert_query_to_pg(query))
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, connection: Optional[Any] = None):
+        """Транзакция: все запросы адаптера внутри блока идут на одном соединении
+
+        COMMIT при выходе из блока, ROLLBACK при исключении. Вложенный вызов
+        присоединяется к внешней транзакции. connection - уже взятое из пула
+        соединение (например, из advisory_lock()), тогда новое не берется.
+
+            async with adapter.transaction():
+                await adapter.execute(...)
+                await adapter.execute_many(...)
+        """
+        tx = _current_tx.get()
+        if tx is not None and tx[0] is self:
+            yield
+            return
+
+        async with contextlib.AsyncExitStack() as stack:
+            conn = connection or await stack.enter_async_context((await self._ensure_pool()).acquire())
+            async with conn.transaction():
+                token = _current_tx.set((self, conn, asyncio.Lock()))
+                try:
+                    yield
+                finally:
+                    _current_tx.reset(token)
+
+    @contextlib.asynccontextmanager
+    async def advisory_lock(self, name: str, timeout: Optional[float] = None):
+        """Сессионная advisory-блокировка PostgreSQL по имени на время блока
+
+        Блокировку держит отдельное соединение из пула, поэтому запросы внутри
+        блока (в том числе transaction()) идут как обычно. Блок получает это
+        соединение: transaction(connection=...) может выполняться прямо на нем. Другой процесс с тем же
+        именем ждет освобождения не дольше timeout (по умолчанию command_timeout),
+        а при обрыве соединения сервер снимает блокировку сам.
+
+        Ожидание - опрос pg_try_advisory_lock, а не блокирующий pg_advisory_lock:
+        зависший в pg_advisory_lock запрос держит снимок, и CREATE INDEX CONCURRENTLY
+        у владельца блокировки ждал бы его завершения - взаимная блокировка, которую
+        сервер не обнаруживает.
+        """
+        pool = await self._ensure_pool()
+
+        deadline = asyncio.get_running_loop().time() + (timeout or self._connection_timeout)
+        async with pool.acquire() as conn:
+            while not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", name):
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise asyncio.TimeoutError(f"Advisory-блокировка {name} не получена за отведенное время")
+                await asyncio.sleep(_ADVISORY_LOCK_POLL_INTERVAL)
+            try:
+                yield conn
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", name)
+
     def _convert_query_to_pg(self, query: str) -> str:
         """Конвертировать SQLite запрос в PostgreSQL формат"""
-        # Заменяем ? на $1, $2, etc
-        pg_query = query
-        param_count = 1
-        while '?' in pg_query:
-            pg_query = pg_query.replace('?', f'${param_count}', 1)
-            param_count += 1
-        
-        # Заменяем SQLite специфичные функции
-        replacements = {
-            'datetime(\'now\')': 'NOW()',
-            'datetime(\'now\', \'-30 days\')': 'NOW() - INTERVAL \'30 days\'',
-            'DATE(created_at)': 'DATE(created_at)',
-            'PRAGMA table_info': 'SELECT column_name FROM information_schema.columns WHERE table_name =',
-            'sqlite_master': 'information_schema.tables',
-        }
-        
-        for sqlite_func, pg_func in replacements.items():
-            pg_query = pg_query.replace(sqlite_func, pg_func)
-            
-        return pg_query
+        return convert_query_to_pg(query)
     
     async def create_tables_if_not_exist(self):
-        """Создать таблицы если они не существуют"""
-        tables_sql = self._get_create_tables_sql()
+        """Создать таблицы если они не существуют
+
+        Независимые DDL выполняются параллельно на разных соединениях пула:
+        сначала users (на нее ссылаются внешние ключи), затем остальные таблицы, затем индексы.
+        """
+        base_table_sql, *tables_sql = self._get_create_tables_sql()
         
-        for table_sql in tables_sql:
-            try:
-                await self.execute(table_sql)
-                logger.info(f"Таблица создана или уже существует")
-            except Exception as e:
-                logger.error(f"Ошибка создания таблицы: {e}")
+        await self._execute_ddl(base_table_sql)
+        await asyncio.gather(*(self._execute_ddl(table_sql) for table_sql in tables_sql))
+        await asyncio.gather(*(self._execute_ddl(index_sql) for index_sql in self._get_postgresql_indexes()))
+    
+    async def _execute_ddl(self, sql: str):
+        """Выполнить DDL, не прерывая создание остальных объектов при ошибке"""
+        try:
+            await self.execute(sql)
+            logger.info(f"Объект схемы создан или уже существует")
+        except Exception as e:
+            logger.error(f"Ошибка создания объекта схемы: {e}")
     
-    def _get_create_tables_sql(self) -> List[str]:
-        """Получить SQL для создания таблиц PostgreSQL"""
-        return self._get_postgresql_tables()
+    def _get_create_tables_sql(self) -> Tuple[str, ...]:
+        """Получить SQL для создания таблиц PostgreSQL (первой идет users)"""
+        return _PG_TABLES
     
-    def _get_postgresql_tables(self) -> List[str]:
-        """SQL для создания таблиц PostgreSQL"""
-        return [
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                created_at TIMESTAMP DEFAULT NOW(),
-                requests_used INTEGER DEFAULT 0,
-                is_subscribed BOOLEAN DEFAULT FALSE,
-                subscription_end TIMESTAMP,
-                last_request TIMESTAMP,
-                last_payment_date TIMESTAMP,
-                payment_provider TEXT,
-                role TEXT DEFAULT 'user',
-                unlimited_access BOOLEAN DEFAULT FALSE,
-                blocked BOOLEAN DEFAULT FALSE,
-                bot_blocked BOOLEAN DEFAULT FALSE,
-                blocked_at TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS requests (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT,
-                channels_input TEXT,
-                results TEXT,
-                created_at TIMESTAMP DEFAULT NOW(),
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS payments (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT,
-                payment_id TEXT UNIQUE,
-                provider_payment_id TEXT,
-                amount INTEGER,
-                currency TEXT DEFAULT 'RUB',
-                status TEXT DEFAULT 'pending',
-                invoice_payload TEXT,
-                subscription_months INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT NOW(),
-                completed_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            """
-        ]
+    def _get_postgresql_indexes(self) -> Tuple[str, ...]:
+        """SQL для создания индексов PostgreSQL"""
+        return _PG_INDEXES
 
 
 # Глобальная переменная для хранения экземпляра адаптера
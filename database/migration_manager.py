@@ -3,19 +3,81 @@
 Поддерживает SQLite (локально) и PostgreSQL (production)
 """
 import os
+import re
+import asyncio
+import contextlib
+import contextvars
 import logging
 import importlib
-import importlib.util
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
 from database.db_adapter import DatabaseAdapter
 
 logger = logging.getLogger(__name__)
 
+# Имя файла миграции: <версия>_<описание>.py (например, 001_initial_tables.py)
+_MIGRATION_FILE_RE = re.compile(r'^(\d+)_.*\.py$')
+
+# Параметры сессии пула миграций (аналог PRAGMA synchronous=NORMAL в SQLite):
+# - synchronous_commit=off: COMMIT не ждет сброса WAL на диск. При сбое теряются
+#   лишь последние коммиты, а запись в schema_migrations пропадает вместе с ними,
+#   так что миграция просто повторится при следующем запуске
+# - maintenance_work_mem: больше памяти на сортировку при CREATE INDEX
+# Действуют только на соединения менеджера и исчезают вместе с его пулом
+_MIGRATION_SESSION_SETTINGS = {
+    'synchronous_commit': 'off',
+    'maintenance_work_mem': '128MB',
+}
+
+# Сколько ждать миграцию, которую применяет другой процесс (воркер uvicorn и т.п.):
+# с запасом на CREATE INDEX CONCURRENTLY по большой таблице
+_MIGRATION_LOCK_TIMEOUT = 600
+
+# Запросы к schema_migrations. Параметры - "?" для любой БД: DatabaseAdapter сам
+# переводит их в $1, $2 для PostgreSQL (с кэшем по тексту запроса)
+_IS_APPLIED_SQL = "SELECT 1 FROM schema_migrations WHERE version = ?"
+_RECORD_MIGRATION_SQL = "INSERT INTO schema_migrations (version, description) VALUES (?, ?)"
+_FORGET_MIGRATION_SQL = "DELETE FROM schema_migrations WHERE version = ?"
+
+# Сколько ждать, пока другой процесс пройдет весь список миграций (migrate())
+_MIGRATE_LOCK_TIMEOUT = 1800
+
+# Сколько таблиц индексируется одновременно (по соединению пула на каждую)
+_INDEX_BUILD_CONCURRENCY = 4
+
+# Режимы запуска миграций при старте сервиса (переменная MIGRATION_MODE):
+# sync - дождаться миграций до запуска сервисов, async - применять в фоне,
+# пока сервис уже работает, skip - не запускать (локальная разработка)
+_MIGRATION_MODES = ('sync', 'async', 'skip')
+
+# Состояние прогона migrate() в этом процессе - для мониторинга здоровья:
+# state: idle | running | succeeded | failed | skipped, current - применяемая версия
+migration_status: Dict[str, Any] = {'state': 'idle', 'current': None, 'error': None}
+
+# Менеджер, применяющий текущую миграцию: validate_constraint_later() записывает
+# в него ограничение, которое нужно проверить после прогона
+_current_manager: contextvars.ContextVar = contextvars.ContextVar('migration_manager', default=None)
+
+# Фоновая задача режима async (ссылка держит задачу от сборщика мусора)
+_background_task: Optional[asyncio.Task] = None
+
+# Фоновые проверки ограничений после миграций (ссылки держат задачи от сборщика мусора)
+_validation_tasks: Set[asyncio.Task] = set()
+
+# Снимок схемы {таблица: столбцы} на время одной миграции: столбцы всех таблиц
+# читаются одним запросом при первом обращении, а не отдельным запросом на таблицу.
+# add_columns_batch()/drop_columns_batch() поддерживают его в актуальном состоянии
+_schema_snapshot: contextvars.ContextVar = contextvars.ContextVar('migration_schema', default=None)
+
 class Migration:
     """Базовый класс для миграций"""
     
+    # up()/down() и запись в schema_migrations выполняются в одной транзакции.
+    # False - для миграций, которые глушат ошибки отдельных запросов (ADD COLUMN
+    # уже существующего столбца и т.п.): в PostgreSQL такая ошибка прерывает всю транзакцию
+    atomic = True
+    
     def __init__(self, version: str, description: str):
         self.version = version
         self.description = description
@@ -32,6 +94,187 @@ class Migration:
     def __str__(self):
         return f"Migration {self.version}: {self.description}"
 
+async def _fetch_columns(adapter: DatabaseAdapter, table: Optional[str] = None) -> Dict[str, Set[str]]:
+    """Прочитать столбцы одной таблицы или всех таблиц схемы: {таблица: столбцы}"""
+    query = """
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema()
+    """
+    if table is None:
+        rows = await adapter.fetch_all(query)
+    else:
+        rows = await adapter.fetch_all(query + " AND table_name = $1", (table,))
+    
+    columns: Dict[str, Set[str]] = {}
+    for row in rows:
+        columns.setdefault(row['table_name'], set()).add(row['column_name'])
+    return columns
+
+
+async def get_existing_columns(adapter: DatabaseAdapter, table: str) -> Set[str]:
+    """Получить имена столбцов таблицы (пустое множество - таблицы нет)
+
+    Внутри миграции ответ берется из снимка схемы. Таблицу, которой нет в снимке,
+    перепроверяем отдельным запросом: ее могла создать сама миграция.
+    """
+    snapshot = _schema_snapshot.get()
+    if snapshot is None:
+        return (await _fetch_columns(adapter, table)).get(table, set())
+    
+    # setdefault, а не update: параллельная задача той же миграции (asyncio.gather)
+    # могла уже дополнить множество столбцов, пока шел наш запрос к каталогу
+    if not snapshot:
+        for name, columns in (await _fetch_columns(adapter)).items():
+            snapshot.setdefault(name, columns)
+    if table not in snapshot:
+        for name, columns in (await _fetch_columns(adapter, table)).items():
+            snapshot.setdefault(name, columns)
+    return snapshot.get(table, set())
+
+
+async def add_columns_batch(adapter: DatabaseAdapter, table: str, columns: Sequence[Tuple[str, str]]) -> List[str]:
+    """Добавить недостающие столбцы таблицы, вернуть имена добавленных
+
+    Все столбцы добавляются одним ALTER TABLE (одна блокировка таблицы вместо
+    одной на столбец). Уже существующие столбцы отсеиваются заранее, без неудачных DDL.
+    """
+    existing = await get_existing_columns(adapter, table)
+    if not existing:
+        logger.info(f"ℹ️ Таблица {table} не найдена, пропускаем добавление столбцов")
+        return []
+    
+    missing = [(name, definition) for name, definition in columns if name not in existing]
+    if not missing:
+        return []
+    
+    clauses = ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {definition}" for name, definition in missing)
+    await adapter.execute(f"ALTER TABLE {table} {clauses}")
+    
+    added = [name for name, _ in missing]
+    existing.update(added)
+    logger.info(f"✅ В таблицу {table} добавлены столбцы: {', '.join(added)}")
+    return added
+
+
+async def drop_columns_batch(adapter: DatabaseAdapter, table: str, columns: Sequence[str]) -> List[str]:
+    """Удалить существующие из перечисленных столбцов таблицы, вернуть имена удаленных"""
+    existing = await get_existing_columns(adapter, table)
+    present = [name for name in columns if name in existing]
+    if not present:
+        return []
+    
+    clauses = ", ".join(f"DROP COLUMN IF EXISTS {name}" for name in present)
+    await adapter.execute(f"ALTER TABLE {table} {clauses}")
+
+    existing.difference_update(present)
+    logger.info(f"✅ Из таблицы {table} удалены столбцы: {', '.join(present)}")
+    return present
+
+
+async def execute_script(adapter: DatabaseAdapter, statements: Sequence[str]):
+    """Выполнить DDL-операторы без параметров по порядку
+
+    Операторы уходят одним запросом (простой протокол asyncpg допускает
+    несколько операторов через ;) - один сетевой обмен вместо N.
+    """
+    await adapter.execute(";\n".join(statements))
+
+
+async def _load_index_validity(adapter: DatabaseAdapter, names: Sequence[str]) -> Dict[str, bool]:
+    """Какие из индексов уже есть в схеме public: имя -> индекс валиден (одним запросом)"""
+    rows = await adapter.fetch_all("""
+        SELECT c.relname AS name, i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = ANY($1::text[])
+    """, (list(names),))
+    return {row['name']: row['valid'] for row in rows}
+
+
+async def _create_index_concurrently(adapter: DatabaseAdapter, name: str, table: str, definition: str,
+                                     rebuild: bool = False) -> bool:
+    """Построить один индекс CONCURRENTLY, при ошибке убрать его INVALID-остаток
+
+    rebuild=True - сначала удалить INVALID-индекс с тем же именем (остаток
+    прерванного построения), иначе IF NOT EXISTS молча его пропустит.
+    """
+    try:
+        if rebuild:
+            await adapter.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        await adapter.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        logger.debug(f"✅ Создан индекс {name}")
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Ошибка создания индекса {name}: {e}")
+        # Прерванный CONCURRENTLY оставляет INVALID-индекс, который IF NOT EXISTS
+        # при следующем запуске молча пропустил бы
+        await adapter.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        return False
+
+
+async def create_indexes(adapter: DatabaseAdapter, indexes: Sequence[Tuple[str, str, str]]) -> List[str]:
+    """Создать индексы (имя, таблица, определение), вернуть имена созданных
+
+    CREATE INDEX CONCURRENTLY: построение не блокирует запись в
+    таблицу. Такой оператор нельзя выполнять в транзакции или в пакете с другими,
+    поэтому миграция, которая его вызывает, должна быть atomic = False. Индексы
+    разных таблиц строятся параллельно на отдельных соединениях пула, индексы
+    одной таблицы - по очереди (CONCURRENTLY конфликтует сам с собой по блокировке).
+    Ошибка одного индекса не мешает остальным - она логируется.
+
+    Уже существующие валидные индексы отсеиваются одним запросом к каталогу:
+    при повторном прогоне ни одна команда CREATE INDEX не отправляется.
+    """
+    if not indexes:
+        return []
+    
+    validity = await _load_index_validity(adapter, [name for name, _, _ in indexes])
+    
+    by_table: Dict[str, List[Tuple[str, str, str]]] = {}
+    for index in indexes:
+        if validity.get(index[0]):
+            continue
+        by_table.setdefault(index[1], []).append(index)
+    
+    semaphore = asyncio.Semaphore(_INDEX_BUILD_CONCURRENCY)
+    
+    async def build_table(table_indexes: List[Tuple[str, str, str]]) -> List[str]:
+        async with semaphore:
+            return [name for name, table, definition in table_indexes
+                    if await _create_index_concurrently(adapter, name, table, definition,
+                                                        rebuild=name in validity)]
+    
+    results = await asyncio.gather(*(build_table(table_indexes) for table_indexes in by_table.values()))
+    return [name for names in results for name in names]
+
+
+def validate_constraint_later(table: str, constraint: str):
+    """Отложить VALIDATE CONSTRAINT для ограничения NOT VALID до конца прогона миграций
+
+    Миграция только записывает ограничение. Проверку запускает сам MigrationManager
+    одной фоновой задачей, когда все миграции применены и advisory-блокировка снята:
+    VALIDATE просматривает всю таблицу и держит SHARE UPDATE EXCLUSIVE, которая
+    конфликтует с ALTER TABLE и CREATE INDEX CONCURRENTLY следующих миграций.
+    Новые строки ограничение проверяет с момента создания. Ошибка проверки
+    только логируется; если процесс завершится раньше, ограничение останется NOT VALID.
+    """
+    manager = _current_manager.get()
+    if manager is None:
+        raise RuntimeError("validate_constraint_later() вызывается только из миграции MigrationManager")
+    manager._pending_validations.append((table, constraint))
+
+
+async def _validate_constraint(adapter: DatabaseAdapter, table: str, constraint: str):
+    """VALIDATE CONSTRAINT с логированием результата"""
+    try:
+        await adapter.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+        logger.info(f"✅ Проверено ограничение {constraint}")
+    except Exception as e:
+        # Старые нарушения можно исправить позже - ограничение уже действует для новых строк
+        logger.warning(f"⚠️ Ограничение {constraint} создано, но не проверено: {e}")
+
+
 class MigrationManager:
     """Менеджер миграций"""
     
@@ -39,157 +282,269 @@ class MigrationManager:
         self.database_url = database_url
         self.migrations_dir = Path(__file__).parent / "migrations"
         self.migrations_dir.mkdir(exist_ok=True)
+        # Одно подключение на весь прогон миграций вместо нового на каждый вызов
+        self._adapter: Optional[DatabaseAdapter] = None
+        self._migrations_table_ready = False
+        # Индекс версия -> файл миграции, пересобирается при изменении mtime каталога
+        self._migration_index: Dict[str, Path] = {}
+        self._migration_index_mtime: Optional[int] = None
+        # Загруженные миграции по версии: экземпляры Migration не хранят состояния
+        self._loaded_migrations: Dict[str, Migration] = {}
+        # Ограничения (таблица, имя), записанные validate_constraint_later() за прогон
+        self._pending_validations: List[Tuple[str, str]] = []
+        # Вызов apply_migration() изнутри migrate(): проверки запускаются после всего прогона
+        self._in_migrate = False
+        # Фоновая задача проверок, запущенная после прогона (None, если проверять нечего)
+        self.validation_task: Optional[asyncio.Task] = None
+    
+    async def _get_adapter(self) -> DatabaseAdapter:
+        """Получить общий адаптер, подключившись при первом обращении"""
+        if self._adapter is None:
+            self._adapter = DatabaseAdapter(self.database_url)
+            self._adapter.server_settings = dict(_MIGRATION_SESSION_SETTINGS)
+        await self._adapter.connect()  # Ничего не делает, если пул уже открыт
+        return self._adapter
+    
+    async def close(self):
+        """Закрыть общий адаптер миграций
+
+        Фоновая проверка ограничений идет на своем пуле и продолжается.
+        """
+        if self._adapter is not None:
+            await self._adapter.disconnect()
+            self._adapter = None
+    
+    def _start_validations(self):
+        """Запустить отложенные проверки ограничений одной фоновой задачей
+
+        Вызывается после снятия advisory-блокировки: ограничения проверяются по
+        очереди на отдельном пуле, который задача сама открывает и закрывает.
+        При остановке event loop задача отменяется вместе с остальными.
+        """
+        if not self._pending_validations:
+            return
+        constraints, self._pending_validations = self._pending_validations, []
+        
+        async def validate_all():
+            adapter = DatabaseAdapter(self.database_url)
+            try:
+                await adapter.connect()
+                for table, constraint in constraints:
+                    await _validate_constraint(adapter, table, constraint)
+            except asyncio.CancelledError:
+                logger.warning("⚠️ Проверка ограничений прервана - непроверенные остаются NOT VALID")
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Проверка ограничений не выполнена: {e}")
+            finally:
+                await adapter.close()
+        
+        task = self.validation_task = asyncio.create_task(validate_all())
+        _validation_tasks.add(task)
+        task.add_done_callback(_validation_tasks.discard)
         
     async def init_migrations_table(self):
         """Создать таблицу для отслеживания миграций"""
-        adapter = DatabaseAdapter(self.database_url)
-        await adapter.connect()
+        if self._migrations_table_ready:
+            return
         
-        try:
-            if adapter.db_type == 'sqlite':
-                query = """
-                    CREATE TABLE IF NOT EXISTS schema_migrations (
-                        version VARCHAR(255) PRIMARY KEY,
-                        description TEXT NOT NULL,
-                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """
-            else:  # PostgreSQL
-                query = """
-                    CREATE TABLE IF NOT EXISTS schema_migrations (
-                        version VARCHAR(255) PRIMARY KEY,
-                        description TEXT NOT NULL,
-                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """
-            
+        adapter = await self._get_adapter()
+        
+        if adapter.db_type == 'sqlite':
+            query = """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version VARCHAR(255) PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+        else:  # PostgreSQL
+            query = """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version VARCHAR(255) PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+        
+        # Одновременный CREATE TABLE IF NOT EXISTS из нескольких процессов падает
+        # на уникальности имени типа в pg_type - создаем таблицу по очереди
+        async with adapter.advisory_lock("schema_migrations", timeout=_MIGRATION_LOCK_TIMEOUT):
             await adapter.execute(query)
-            logger.info("✅ Таблица schema_migrations готова")
-            
-        finally:
-            await adapter.disconnect()
+        self._migrations_table_ready = True
+        logger.info("✅ Таблица schema_migrations готова")
     
-    async def get_applied_migrations(self) -> List[str]:
-        """Получить список примененных миграций"""
-        adapter = DatabaseAdapter(self.database_url)
-        await adapter.connect()
-        
+    async def get_applied_migrations(self) -> Set[str]:
+        """Получить множество примененных миграций
+
+        Таблицу schema_migrations заранее создает init_migrations_table() в migrate()/status().
+        """
+        adapter = await self._get_adapter()
+        rows = await adapter.fetch_all("SELECT version FROM schema_migrations")
+        return {row['version'] for row in rows}
+    
+    async def _is_applied(self, version: str) -> bool:
+        """Проверить по schema_migrations, применена ли миграция"""
+        await self.init_migrations_table()  # apply_migration() вызывают и в обход migrate()
+        adapter = await self._get_adapter()
+        return bool(await adapter.fetch_val(_IS_APPLIED_SQL, (version,)))
+    
+    def _get_migration_index(self) -> Dict[str, Path]:
+        """Получить индекс файлов миграций, просканировав каталог только при его изменении"""
         try:
-            await self.init_migrations_table()
-            
-            if adapter.db_type == 'sqlite':
-                query = "SELECT version FROM schema_migrations ORDER BY version"
-            else:  # PostgreSQL
-                query = "SELECT version FROM schema_migrations ORDER BY version"
-            
-            result = await adapter.fetch_all(query)
-            
-            # Обрабатываем результат в зависимости от формата
-            versions = []
-            if result:
-                for row in result:
-                    if isinstance(row, (list, tuple)):
-                        versions.append(row[0])
-                    elif isinstance(row, dict):
-                        versions.append(row['version'])
-                    else:
-                        versions.append(str(row))
-            
-            return versions
-            
-        finally:
-            await adapter.disconnect()
+            mtime = os.stat(self.migrations_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._migration_index, self._migration_index_mtime = {}, None
+            return self._migration_index
+        
+        if mtime == self._migration_index_mtime:
+            return self._migration_index
+        
+        index: Dict[str, Path] = {}
+        with os.scandir(self.migrations_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                match = _MIGRATION_FILE_RE.match(entry.name)
+                if not match or not entry.is_file():
+                    continue
+                version = match.group(1)
+                if version in index:
+                    logger.warning(
+                        f"⚠️ Дублирующаяся версия миграции {version}: "
+                        f"{entry.name} пропущен, используется {index[version].name}"
+                    )
+                    continue
+                index[version] = Path(entry.path)
+        
+        self._migration_index, self._migration_index_mtime = index, mtime
+        return index
     
     def discover_migrations(self) -> List[str]:
         """Найти все файлы миграций"""
-        migration_files = []
-        
-        if self.migrations_dir.exists():
-            for file_path in sorted(self.migrations_dir.glob("*.py")):
-                if file_path.name != "__init__.py":
-                    # Извлекаем версию из имени файла (например, 001_initial.py -> 001)
-                    version = file_path.stem.split('_')[0]
-                    migration_files.append(version)
-        
-        return migration_files
+        return sorted(self._get_migration_index())
     
     async def load_migration(self, version: str) -> Migration:
         """Загрузить миграцию по версии"""
-        # Находим файл миграции
-        migration_file = None
-        for file_path in self.migrations_dir.glob(f"{version}_*.py"):
-            migration_file = file_path
-            break
+        migration = self._loaded_migrations.get(version)
+        if migration is not None:
+            return migration
+        
+        migration_file = self._get_migration_index().get(version)
         
         if not migration_file:
             raise FileNotFoundError(f"Миграция {version} не найдена")
         
-        # Импортируем модуль миграции
+        # Импортируем модуль миграции через пакет database.migrations,
+        # чтобы работали sys.modules и скомпилированный .pyc
         module_name = f"database.migrations.{migration_file.stem}"
-        spec = importlib.util.spec_from_file_location(module_name, migration_file)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        module = importlib.import_module(module_name)
         
         # Получаем класс миграции
         migration_class = getattr(module, 'Migration')
-        return migration_class()
+        migration = migration_class()
+        self._loaded_migrations[version] = migration
+        return migration
+    
+    @contextlib.asynccontextmanager
+    async def _migration_scope(self, adapter: DatabaseAdapter, migration: Migration, connection: Optional[Any] = None):
+        """Свой снимок схемы и транзакция (для атомарной миграции) на время миграции
+
+        connection - соединение advisory-блокировки миграции: атомарная миграция
+        целиком идет на нем, второе соединение из пула не занимается. Неатомарной
+        оно не навязывается - ее шаги (create_indexes, gather) идут параллельно
+        на разных соединениях пула.
+        """
+        token = _schema_snapshot.set({})
+        manager_token = _current_manager.set(self)
+        try:
+            if getattr(migration, 'atomic', True):  # 006/007 не наследуют Migration
+                async with adapter.transaction(connection):
+                    yield
+            else:
+                yield
+        finally:
+            _current_manager.reset(manager_token)
+            _schema_snapshot.reset(token)
     
     async def apply_migration(self, version: str):
         """Применить конкретную миграцию"""
-        adapter = DatabaseAdapter(self.database_url)
-        await adapter.connect()
+        adapter = await self._get_adapter()
+        # Проверки, записанные откаченной миграцией, не выполняются
+        recorded = len(self._pending_validations)
         
         try:
             migration = await self.load_migration(version)
             
             logger.info(f"Применяем миграцию {version}: {migration.description}")
-            await migration.up(adapter)
-            
-            # Записываем в таблицу миграций
-            if adapter.db_type == 'sqlite':
-                query = "INSERT INTO schema_migrations (version, description) VALUES (?, ?)"
-            else:  # PostgreSQL
-                query = "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)"
             
-            await adapter.execute(query, (version, migration.description))
+            # Воркеры, стартующие одновременно, применяют миграцию по очереди:
+            # дождавшийся блокировки видит запись первого и ничего не делает
+            async with adapter.advisory_lock(f"migration_{version}", timeout=_MIGRATION_LOCK_TIMEOUT) as connection:
+                if await self._is_applied(version):
+                    logger.info(f"ℹ️ Миграция {version} уже применена другим процессом")
+                    return
+                
+                async with self._migration_scope(adapter, migration, connection):
+                    await migration.up(adapter)
+                    await adapter.execute(_RECORD_MIGRATION_SQL, (version, migration.description))
             logger.info(f"✅ Миграция {version} применена")
             
         except Exception as e:
+            del self._pending_validations[recorded:]
             logger.error(f"❌ Ошибка применения миграции {version}: {e}")
             raise
-        finally:
-            await adapter.disconnect()
+        
+        if not self._in_migrate:
+            self._start_validations()
     
     async def rollback_migration(self, version: str):
         """Откатить миграцию"""
-        adapter = DatabaseAdapter(self.database_url)
-        await adapter.connect()
+        adapter = await self._get_adapter()
         
         try:
             migration = await self.load_migration(version)
             
             logger.info(f"Откатываем миграцию {version}: {migration.description}")
-            await migration.down(adapter)
             
-            # Удаляем из таблицы миграций
-            if adapter.db_type == 'sqlite':
-                query = "DELETE FROM schema_migrations WHERE version = ?"
-            else:  # PostgreSQL
-                query = "DELETE FROM schema_migrations WHERE version = $1"
-            
-            await adapter.execute(query, (version,))
+            async with adapter.advisory_lock(f"migration_{version}", timeout=_MIGRATION_LOCK_TIMEOUT) as connection:
+                if not await self._is_applied(version):
+                    logger.info(f"ℹ️ Миграция {version} уже откачена другим процессом")
+                    return
+                
+                async with self._migration_scope(adapter, migration, connection):
+                    await migration.down(adapter)
+                    await adapter.execute(_FORGET_MIGRATION_SQL, (version,))
             logger.info(f"✅ Миграция {version} откачена")
             
         except Exception as e:
             logger.error(f"❌ Ошибка отката миграции {version}: {e}")
             raise
-        finally:
-            await adapter.disconnect()
     
     async def migrate(self):
         """Применить все неприменённые миграции"""
         logger.info("🚀 Запуск системы миграций...")
+        migration_status.update(state='running', current=None, error=None)
         
+        adapter = await self._get_adapter()
+        try:
+            # Весь прогон - под одной блокировкой: при одновременном старте (rolling
+            # deploy) второй процесс дожидается первого и находит все миграции
+            # примененными, а не проходит список вперемешку с ним
+            async with adapter.advisory_lock("migrate", timeout=_MIGRATE_LOCK_TIMEOUT):
+                self._in_migrate = True
+                try:
+                    await self._apply_pending()
+                finally:
+                    self._in_migrate = False
+        except Exception as e:
+            self._pending_validations.clear()
+            migration_status.update(state='failed', error=str(e))
+            raise
+        migration_status.update(state='succeeded', current=None)
+        # Блокировка снята: VALIDATE больше не мешает миграциям
+        self._start_validations()
+    
+    async def _apply_pending(self):
+        """Применить по порядку миграции, которых еще нет в schema_migrations"""
         await self.init_migrations_table()
         
         applied_migrations = await self.get_applied_migrations()
@@ -204,6 +559,7 @@ class MigrationManager:
         logger.info(f"📋 Найдено {len(pending_migrations)} новых миграций")
         
         for version in pending_migrations:
+            migration_status['current'] = version
             await self.apply_migration(version)
         
         logger.info(f"✅ Применено {len(pending_migrations)} миграций")
@@ -275,10 +631,54 @@ Migration = Migration{next_version}
 # Глобальная функция для автоматического запуска миграций
 async def auto_migrate(database_url: str):
     """Автоматически применить все миграции при запуске приложения"""
+    manager = MigrationManager(database_url)
     try:
-        manager = MigrationManager(database_url)
         await manager.migrate()
     except Exception as e:
         logger.error(f"❌ Ошибка автоматических миграций: {e}")
         # Не прерываем запуск приложения из-за ошибок миграций
         pass
+    finally:
+        await manager.close()
+
+
+async def run_migrations(database_url: str, mode: Optional[str] = None) -> Optional[asyncio.Task]:
+    """Применить миграции при старте сервиса в режиме MIGRATION_MODE
+
+    В режиме async возвращает фоновую задачу: сервис запускается сразу, а ход
+    миграций виден в migration_status. Воркеры, стартующие одновременно, не
+    мешают друг другу - каждую миграцию сериализует advisory-блокировка.
+    """
+    global _background_task
+    
+    mode = (mode or os.getenv('MIGRATION_MODE', 'sync')).lower()
+    if mode not in _MIGRATION_MODES:
+        logger.warning(f"⚠️ Неизвестный MIGRATION_MODE={mode}, используется sync")
+        mode = 'sync'
+    
+    if mode == 'skip':
+        migration_status.update(state='skipped', current=None, error=None)
+        logger.info("ℹ️ MIGRATION_MODE=skip - миграции не запускаются")
+        return None
+    
+    async def run():
+        manager = MigrationManager(database_url)
+        try:
+            await manager.migrate()
+        finally:
+            await manager.close()
+    
+    if mode == 'sync':
+        await run()
+        return None
+    
+    async def run_in_background():
+        try:
+            await run()
+        except Exception as e:
+            # Ошибка уже в migration_status - сервис продолжает работать
+            logger.error(f"❌ Фоновые миграции завершились ошибкой: {e}")
+    
+    logger.info("🔄 Миграции применяются в фоне (MIGRATION_MODE=async)")
+    _background_task = asyncio.create_task(run_in_background())
+    return _background_task
@@ -6,6 +6,80 @@ from database.migration_manager import Migration
 from database.db_adapter import DatabaseAdapter
 from passlib.context import CryptContext
 
+# DDL и запросы по типу БД - собираются один раз при импорте, а не на каждый вызов up()
+_DDL = {
+    'sqlite': {
+        'admin_users': """
+            CREATE TABLE IF NOT EXISTS admin_users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                role TEXT NOT NULL DEFAULT 'moderator',
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                created_by INTEGER,
+                FOREIGN KEY (created_by) REFERENCES admin_users (id)
+            )
+        """,
+        'roles': """
+            CREATE TABLE IF NOT EXISTS roles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                display_name TEXT NOT NULL,
+                permissions TEXT NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        'insert_role': """
+            INSERT OR IGNORE INTO roles (name, display_name, permissions, description)
+            VALUES (?, ?, ?, ?)
+        """,
+        'insert_admin': """
+            INSERT OR IGNORE INTO admin_users (username, email, password_hash, role, is_active)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+    },
+    'postgresql': {
+        'admin_users': """
+            CREATE TABLE IF NOT EXISTS admin_users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR(255) UNIQUE NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                role VARCHAR(100) NOT NULL DEFAULT 'moderator',
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                created_by INTEGER,
+                FOREIGN KEY (created_by) REFERENCES admin_users (id)
+            )
+        """,
+        'roles': """
+            CREATE TABLE IF NOT EXISTS roles (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(100) UNIQUE NOT NULL,
+                display_name VARCHAR(255) NOT NULL,
+                permissions TEXT NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        'insert_role': """
+            INSERT INTO roles (name, display_name, permissions, description)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (name) DO NOTHING
+        """,
+        'insert_admin': """
+            INSERT INTO admin_users (username, email, password_hash, role, is_active)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (username) DO NOTHING
+        """,
+    },
+}
+
 class Migration002(Migration):
     def __init__(self):
         super().__init__("002", "Создание системы администрирования (admin_users, roles)")
@@ -13,65 +87,7 @@ class Migration002(Migration):
     
     async def up(self, adapter: DatabaseAdapter):
         """Применить миграцию"""
-        # Таблица админ пользователей
-        if adapter.db_type == 'sqlite':
-            admin_users_query = """
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    role TEXT NOT NULL DEFAULT 'moderator',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    created_by INTEGER,
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        else:  # PostgreSQL
-            admin_users_query = """
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(255) UNIQUE NOT NULL,
-                    email VARCHAR(255) UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    role VARCHAR(100) NOT NULL DEFAULT 'moderator',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    created_by INTEGER,
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        
-        await adapter.execute(admin_users_query)
-        
-        # Таблица ролей
-        if adapter.db_type == 'sqlite':
-            roles_query = """
-                CREATE TABLE IF NOT EXISTS roles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    display_name TEXT NOT NULL,
-                    permissions TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-        else:  # PostgreSQL
-            roles_query = """
-                CREATE TABLE IF NOT EXISTS roles (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) UNIQUE NOT NULL,
-                    display_name VARCHAR(255) NOT NULL,
-                    permissions TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-        
-        await adapter.execute(roles_query)
+        ddl = _DDL[adapter.db_type]
         
         # Вставляем роли по умолчанию
         roles = [
@@ -101,38 +117,22 @@ class Migration002(Migration):
             }
         ]
         
-        for role in roles:
-            if adapter.db_type == 'sqlite':
-                query = """
-                    INSERT OR IGNORE INTO roles (name, display_name, permissions, description)
-                    VALUES (?, ?, ?, ?)
-                """
-            else:  # PostgreSQL
-                query = """
-                    INSERT INTO roles (name, display_name, permissions, description)
-                    VALUES ($1, $2, $3, $4)
-                    ON CONFLICT (name) DO NOTHING
-                """
-            
-            await adapter.execute(query, (role['name'], role['display_name'], role['permissions'], role['description']))
-        
         # Создаем админ пользователя по умолчанию
         default_password = "admin123"
         password_hash = self.pwd_context.hash(default_password)
         
-        if adapter.db_type == 'sqlite':
-            admin_query = """
-                INSERT OR IGNORE INTO admin_users (username, email, password_hash, role, is_active)
-                VALUES (?, ?, ?, ?, ?)
-            """
-        else:  # PostgreSQL
-            admin_query = """
-                INSERT INTO admin_users (username, email, password_hash, role, is_active)
-                VALUES ($1, $2, $3, $4, $5)
-                ON CONFLICT (username) DO NOTHING
-            """
-        
-        await adapter.execute(admin_query, ("admin", "admin@localhost", password_hash, "super_admin", True))
+        # Одна транзакция: при ошибке схема не останется заполненной наполовину
+        async with adapter.transaction():
+            await adapter.execute(ddl['admin_users'])
+            await adapter.execute(ddl['roles'])
+            
+            # Все роли одним пакетом вместо отдельного запроса на каждую
+            await adapter.execute_many(ddl['insert_role'], [
+                (role['name'], role['display_name'], role['permissions'], role['description'])
+                for role in roles
+            ])
+            
+            await adapter.execute(ddl['insert_admin'], ("admin", "admin@localhost", password_hash, "super_admin", True))
     
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
@@ -2,136 +2,104 @@
 Миграция 003: Расширенные функции
 Создана: 2025-08-02 22:30:00
 """
-from database.migration_manager import Migration
+from database.migration_manager import Migration, execute_script
 from database.db_adapter import DatabaseAdapter
 
+# Типы столбцов по диалекту: в SQLite строки любой длины - TEXT
+_DIALECT = {
+    'sqlite': {
+        'pk': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'str255': 'TEXT',
+        'str100': 'TEXT',
+        'str50': 'TEXT',
+        'str45': 'TEXT',
+    },
+    'postgresql': {
+        'pk': 'SERIAL PRIMARY KEY',
+        'str255': 'VARCHAR(255)',
+        'str100': 'VARCHAR(100)',
+        'str50': 'VARCHAR(50)',
+        'str45': 'VARCHAR(45)',
+    },
+}
+
+# Шаблоны таблиц: шаблоны сообщений, планировщик рассылок, логи действий
+_TABLE_TEMPLATES = (
+    """
+    CREATE TABLE IF NOT EXISTS message_templates (
+        id {pk},
+        name {str255} NOT NULL,
+        content TEXT NOT NULL,
+        parse_mode {str50} DEFAULT 'HTML',
+        category {str100} DEFAULT 'general',
+        is_active BOOLEAN DEFAULT TRUE,
+        created_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (created_by) REFERENCES admin_users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
+        id {pk},
+        name {str255} NOT NULL,
+        template_id INTEGER,
+        message_text TEXT,
+        parse_mode {str50} DEFAULT 'HTML',
+        scheduled_at TIMESTAMP NOT NULL,
+        status {str50} DEFAULT 'pending',
+        target_users {str100} DEFAULT 'all',
+        sent_count INTEGER DEFAULT 0,
+        failed_count INTEGER DEFAULT 0,
+        created_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+        error_message TEXT,
+        FOREIGN KEY (template_id) REFERENCES message_templates (id),
+        FOREIGN KEY (created_by) REFERENCES admin_users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id {pk},
+        admin_user_id INTEGER,
+        action {str255} NOT NULL,
+        resource_type {str100} NOT NULL,
+        resource_id INTEGER,
+        details TEXT,
+        ip_address {str45},
+        user_agent TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (admin_user_id) REFERENCES admin_users (id)
+    )
+    """,
+)
+
+# DDL по типу БД - собирается один раз при импорте
+_DDL = {
+    db_type: tuple(template.format(**types) for template in _TABLE_TEMPLATES)
+    for db_type, types in _DIALECT.items()
+}
+
 class Migration003(Migration):
     def __init__(self):
         super().__init__("003", "Расширенные функции (шаблоны, планировщик, логи)")
-    
+
     async def up(self, adapter: DatabaseAdapter):
         """Применить миграцию"""
-        # Таблица шаблонов сообщений
-        if adapter.db_type == 'sqlite':
-            templates_query = """
-                CREATE TABLE IF NOT EXISTS message_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    parse_mode TEXT DEFAULT 'HTML',
-                    category TEXT DEFAULT 'general',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        else:  # PostgreSQL
-            templates_query = """
-                CREATE TABLE IF NOT EXISTS message_templates (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    content TEXT NOT NULL,
-                    parse_mode VARCHAR(50) DEFAULT 'HTML',
-                    category VARCHAR(100) DEFAULT 'general',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        
-        await adapter.execute(templates_query)
-        
-        # Таблица планировщика рассылок
-        if adapter.db_type == 'sqlite':
-            scheduled_query = """
-                CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    template_id INTEGER,
-                    message_text TEXT,
-                    parse_mode TEXT DEFAULT 'HTML',
-                    scheduled_at TIMESTAMP NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    target_users TEXT DEFAULT 'all',
-                    sent_count INTEGER DEFAULT 0,
-                    failed_count INTEGER DEFAULT 0,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    started_at TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    error_message TEXT,
-                    FOREIGN KEY (template_id) REFERENCES message_templates (id),
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        else:  # PostgreSQL
-            scheduled_query = """
-                CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    template_id INTEGER,
-                    message_text TEXT,
-                    parse_mode VARCHAR(50) DEFAULT 'HTML',
-                    scheduled_at TIMESTAMP NOT NULL,
-                    status VARCHAR(50) DEFAULT 'pending',
-                    target_users VARCHAR(100) DEFAULT 'all',
-                    sent_count INTEGER DEFAULT 0,
-                    failed_count INTEGER DEFAULT 0,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    started_at TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    error_message TEXT,
-                    FOREIGN KEY (template_id) REFERENCES message_templates (id),
-                    FOREIGN KEY (created_by) REFERENCES admin_users (id)
-                )
-            """
-        
-        await adapter.execute(scheduled_query)
-        
-        # Таблица логов действий
-        if adapter.db_type == 'sqlite':
-            audit_query = """
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    admin_user_id INTEGER,
-                    action TEXT NOT NULL,
-                    resource_type TEXT NOT NULL,
-                    resource_id INTEGER,
-                    details TEXT,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (admin_user_id) REFERENCES admin_users (id)
-                )
-            """
-        else:  # PostgreSQL
-            audit_query = """
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id SERIAL PRIMARY KEY,
-                    admin_user_id INTEGER,
-                    action VARCHAR(255) NOT NULL,
-                    resource_type VARCHAR(100) NOT NULL,
-                    resource_id INTEGER,
-                    details TEXT,
-                    ip_address VARCHAR(45),
-                    user_agent TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (admin_user_id) REFERENCES admin_users (id)
-                )
-            """
-        
-        await adapter.execute(audit_query)
-    
+        # Таблицы создаются по порядку: scheduled_broadcasts ссылается на message_templates.
+        # Независимую audit_logs тоже не выносим в gather: миграция атомарна и идет
+        # в одной транзакции на одном соединении, DDL с других соединений в нее не попадет
+        await execute_script(adapter, _DDL[adapter.db_type])
+
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
-        await adapter.execute("DROP TABLE IF EXISTS audit_logs")
-        await adapter.execute("DROP TABLE IF EXISTS scheduled_broadcasts")
-        await adapter.execute("DROP TABLE IF EXISTS message_templates")
+        await execute_script(adapter, (
+            "DROP TABLE IF EXISTS audit_logs",
+            "DROP TABLE IF EXISTS scheduled_broadcasts",
+            "DROP TABLE IF EXISTS message_templates",
+        ))
 
 # Экспортируем класс для менеджера миграций
 Migration = Migration003
@@ -3,31 +3,26 @@
 Добавляет недостающую колонку scheduled_time и исправляет несоответствия
 """
 
+import logging
 from database.db_adapter import DatabaseAdapter
+from database.migration_manager import add_columns_batch, create_indexes, drop_columns_batch, get_existing_columns
+
+logger = logging.getLogger(__name__)
 
 class Migration006:
     """Исправление схемы таблицы broadcasts"""
 
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
     description = "Исправление схемы таблицы broadcasts - добавление недостающих колонок и индексов"
     
     async def up(self, adapter: DatabaseAdapter):
         """Применить миграцию"""
         
-        # Добавляем колонку scheduled_time в таблицу broadcasts
-        try:
-            await adapter.execute("""
-                ALTER TABLE broadcasts 
-                ADD COLUMN scheduled_time TIMESTAMP
-            """)
-            print("✅ Добавлена колонка scheduled_time в таблицу broadcasts")
-        except Exception as e:
-            if "already exists" in str(e).lower():
-                print("ℹ️ Колонка scheduled_time уже существует")
-            else:
-                print(f"⚠️ Ошибка при добавлении scheduled_time: {e}")
-        
-        # Добавляем недостающие колонки если их нет
+        # Добавляем scheduled_time и другие недостающие колонки, если их нет
         columns_to_add = [
+            ("scheduled_time", "TIMESTAMP"),
             ("title", "VARCHAR(255)"),
             ("status", "VARCHAR(50) DEFAULT 'pending'"),
             ("parse_mode", "VARCHAR(50) DEFAULT 'HTML'"),
@@ -38,18 +33,8 @@ class Migration006:
             ("error_message", "TEXT")
         ]
         
-        for column_name, column_type in columns_to_add:
-            try:
-                await adapter.execute(f"""
-                    ALTER TABLE broadcasts 
-                    ADD COLUMN {column_name} {column_type}
-                """)
-                print(f"✅ Добавлена колонка {column_name}")
-            except Exception as e:
-                if "already exists" in str(e).lower():
-                    print(f"ℹ️ Колонка {column_name} уже существует")
-                else:
-                    print(f"⚠️ Ошибка при добавлении {column_name}: {e}")
+        # Добавленные столбцы логирует сам add_columns_batch()
+        await add_columns_batch(adapter, "broadcasts", columns_to_add)
         
         # Создаем индексы для производительности
         indexes = [
@@ -59,15 +44,17 @@ class Migration006:
             ("idx_broadcasts_target_users", "broadcasts", "target_users")
         ]
         
+        # Индексы без столбца отсеиваем заранее, без неудачных DDL
+        existing_columns = await get_existing_columns(adapter, "broadcasts")
+        to_create = []
         for index_name, table_name, column_name in indexes:
-            try:
-                await adapter.execute(f"""
-                    CREATE INDEX IF NOT EXISTS {index_name} 
-                    ON {table_name} ({column_name})
-                """)
-                print(f"✅ Создан индекс {index_name}")
-            except Exception as e:
-                print(f"⚠️ Ошибка при создании индекса {index_name}: {e}")
+            if column_name not in existing_columns:
+                logger.info(f"ℹ️ Нет столбца {table_name}.{column_name}, пропускаем индекс {index_name}")
+                continue
+            to_create.append((index_name, table_name, f"({column_name})"))
+        
+        for index_name in await create_indexes(adapter, to_create):
+            logger.debug(f"✅ Создан индекс {index_name}")
     
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
@@ -80,13 +67,6 @@ class Migration006:
             "idx_broadcasts_target_users"
         ]
         
-        for index_name in indexes:
-            try:
-                await adapter.execute(f"DROP INDEX IF EXISTS {index_name}")
-                print(f"✅ Удален индекс {index_name}")
-            except Exception as e:
-                print(f"⚠️ Ошибка при удалении индекса {index_name}: {e}")
-        
         # Удаляем добавленные колонки
         columns_to_remove = [
             "scheduled_time", "title", "status", "parse_mode", 
@@ -94,12 +74,13 @@ class Migration006:
             "completed_at", "error_message"
         ]
         
-        for column_name in columns_to_remove:
-            try:
-                await adapter.execute(f"ALTER TABLE broadcasts DROP COLUMN {column_name}")
-                print(f"✅ Удалена колонка {column_name}")
-            except Exception as e:
-                print(f"⚠️ Ошибка при удалении колонки {column_name}: {e}")
+        # Откат не строит индексы CONCURRENTLY, поэтому, в отличие от up(), идет одной транзакцией
+        async with adapter.transaction():
+            for index_name in indexes:
+                await adapter.execute(f"DROP INDEX IF EXISTS {index_name}")
+                logger.debug(f"✅ Удален индекс {index_name}")
+            
+            await drop_columns_batch(adapter, "broadcasts", columns_to_remove)
 
 # Экспортируем класс для менеджера миграций
 Migration = Migration006
@@ -2,7 +2,19 @@
 Миграция 007: Добавление поддержки медиафайлов в рассылки
 """
 
+import logging
 from database.db_adapter import DatabaseAdapter
+from database.migration_manager import add_columns_batch, drop_columns_batch
+
+logger = logging.getLogger(__name__)
+
+# Колонки медиафайлов (в типах PostgreSQL, для SQLite их переводит add_columns_batch())
+_MEDIA_COLUMNS = (
+    ("message_type", "VARCHAR(50) DEFAULT 'text'"),
+    ("media_file", "TEXT"),
+    ("media_type", "VARCHAR(50)"),
+    ("media_caption", "TEXT"),
+)
 
 
 class Migration007:
@@ -12,99 +24,31 @@ class Migration007:
     
     async def up(self, adapter: DatabaseAdapter):
         """Применить миграцию"""
-        print("🔄 Применение миграции 007: Добавление поддержки медиафайлов...")
+        logger.info("🔄 Применение миграции 007: Добавление поддержки медиафайлов...")
         
         # Добавляем колонки для медиафайлов в таблицу broadcasts
-        media_columns = [
-            ("message_type", "VARCHAR(50) DEFAULT 'text'"),
-            ("media_file", "TEXT"),
-            ("media_type", "VARCHAR(50)"),
-            ("media_caption", "TEXT")
-        ]
-        
-        for column_name, column_type in media_columns:
-            try:
-                if adapter.db_type == 'sqlite':
-                    query = f"ALTER TABLE broadcasts ADD COLUMN {column_name} {column_type.replace('VARCHAR', 'TEXT')}"
-                else:  # PostgreSQL
-                    query = f"ALTER TABLE broadcasts ADD COLUMN {column_name} {column_type}"
-                
-                await adapter.execute(query)
-                print(f"✅ Добавлена колонка {column_name} в таблицу broadcasts")
-                
-            except Exception as e:
-                if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                    print(f"ℹ️ Колонка {column_name} уже существует в таблице broadcasts")
-                else:
-                    print(f"⚠️ Ошибка при добавлении колонки {column_name}: {e}")
+        # (добавленные столбцы логирует сам add_columns_batch())
+        await add_columns_batch(adapter, "broadcasts", _MEDIA_COLUMNS)
         
-        # Также добавляем поддержку медиафайлов в scheduled_broadcasts если таблица существует
-        try:
-            # Проверяем существование таблицы scheduled_broadcasts
-            if adapter.db_type == 'sqlite':
-                check_query = "SELECT name FROM sqlite_master WHERE type='table' AND name='scheduled_broadcasts'"
-            else:  # PostgreSQL
-                check_query = "SELECT table_name FROM information_schema.tables WHERE table_name='scheduled_broadcasts'"
-            
-            result = await adapter.fetch_one(check_query)
-            
-            if result:
-                print("🔄 Добавляем поддержку медиафайлов в scheduled_broadcasts...")
-                
-                for column_name, column_type in media_columns:
-                    try:
-                        if adapter.db_type == 'sqlite':
-                            query = f"ALTER TABLE scheduled_broadcasts ADD COLUMN {column_name} {column_type.replace('VARCHAR', 'TEXT')}"
-                        else:  # PostgreSQL
-                            query = f"ALTER TABLE scheduled_broadcasts ADD COLUMN {column_name} {column_type}"
-                        
-                        await adapter.execute(query)
-                        print(f"✅ Добавлена колонка {column_name} в таблицу scheduled_broadcasts")
-                        
-                    except Exception as e:
-                        if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                            print(f"ℹ️ Колонка {column_name} уже существует в таблице scheduled_broadcasts")
-                        else:
-                            print(f"⚠️ Ошибка при добавлении колонки {column_name} в scheduled_broadcasts: {e}")
-            else:
-                print("ℹ️ Таблица scheduled_broadcasts не найдена, пропускаем")
-                
-        except Exception as e:
-            print(f"⚠️ Ошибка при проверке таблицы scheduled_broadcasts: {e}")
+        # Также добавляем поддержку медиафайлов в scheduled_broadcasts (если таблицы нет - пропускается)
+        await add_columns_batch(adapter, "scheduled_broadcasts", _MEDIA_COLUMNS)
         
-        print("✅ Миграция 007 завершена: Поддержка медиафайлов добавлена")
+        logger.info("✅ Миграция 007 завершена: Поддержка медиафайлов добавлена")
     
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
-        print("🔄 Откат миграции 007: Удаление поддержки медиафайлов...")
+        logger.info("🔄 Откат миграции 007: Удаление поддержки медиафайлов...")
         
         # В SQLite нельзя удалять колонки, поэтому просто логируем
         if adapter.db_type == 'sqlite':
-            print("⚠️ SQLite не поддерживает удаление колонок. Откат невозможен.")
+            logger.warning("⚠️ SQLite не поддерживает удаление колонок. Откат невозможен.")
             return
         
         # Для PostgreSQL удаляем колонки
-        media_columns = ["message_type", "media_file", "media_type", "media_caption"]
-        
-        for column_name in media_columns:
-            try:
-                await adapter.execute(f"ALTER TABLE broadcasts DROP COLUMN IF EXISTS {column_name}")
-                print(f"✅ Удалена колонка {column_name} из таблицы broadcasts")
-            except Exception as e:
-                print(f"⚠️ Ошибка при удалении колонки {column_name}: {e}")
-        
-        # Также удаляем из scheduled_broadcasts
-        try:
-            for column_name in media_columns:
-                try:
-                    await adapter.execute(f"ALTER TABLE scheduled_broadcasts DROP COLUMN IF EXISTS {column_name}")
-                    print(f"✅ Удалена колонка {column_name} из таблицы scheduled_broadcasts")
-                except Exception as e:
-                    print(f"⚠️ Ошибка при удалении колонки {column_name} из scheduled_broadcasts: {e}")
-        except Exception as e:
-            print(f"⚠️ Ошибка при работе с таблицей scheduled_broadcasts: {e}")
+        for table in ("broadcasts", "scheduled_broadcasts"):
+            await drop_columns_batch(adapter, table, [name for name, _ in _MEDIA_COLUMNS])
         
-        print("✅ Откат миграции 007 завершен")
+        logger.info("✅ Откат миграции 007 завершен")
 
 
 # Экспорт для системы миграций
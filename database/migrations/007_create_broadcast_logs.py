@@ -44,10 +44,10 @@ async def migrate(adapter: DatabaseAdapter):
         
         # Создаем индексы для оптимизации
         indexes = [
-            ("idx_broadcast_logs_broadcast_id", "broadcast_id"),
             ("idx_broadcast_logs_user_id", "user_id"),
             ("idx_broadcast_logs_status", "status"),
             ("idx_broadcast_logs_created_at", "created_at"),
+            # Покрывает и выборки по одному broadcast_id
             ("idx_broadcast_logs_broadcast_status", "broadcast_id, status")
         ]
         
@@ -77,12 +77,12 @@ async def migrate(adapter: DatabaseAdapter):
                 check_table_query = """
                     SELECT EXISTS (
                         SELECT FROM information_schema.tables 
-                        WHERE table_name = 'broadcasts'
+                        WHERE table_schema = 'public' 
+                        AND table_name = 'broadcasts'
                     )
                 """
-                result = await adapter.fetch_one(check_table_query)
                 
-                if result and result.get('exists', False):
+                if await adapter.fetch_val(check_table_query):
                     # Добавляем внешний ключ
                     fk_query = """
                         ALTER TABLE broadcast_logs 
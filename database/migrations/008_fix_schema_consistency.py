@@ -3,13 +3,21 @@
 Создана: 2025-08-04 22:57:00
 Исправляет все проблемы с внешними ключами, недостающими столбцами и несоответствиями схемы
 """
-from database.migration_manager import Migration
+from database.migration_manager import (
+    Migration, add_columns_batch, create_indexes, get_existing_columns, validate_constraint_later,
+)
 from database.db_adapter import DatabaseAdapter
+from typing import Awaitable, Set, Tuple
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Migration008(Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции,
+    # а ошибки отдельных ALTER/CREATE INDEX глушатся
+    atomic = False
+
     def __init__(self):
         super().__init__("008", "Исправление консистентности схемы БД (внешние ключи, столбцы)")
     
@@ -18,24 +26,35 @@ class Migration008(Migration):
         logger.info("🔧 Начинаем исправление схемы БД...")
         
         try:
-            # 1. Добавляем недостающие столбцы в users
-            await self._fix_users_table(adapter)
+            # 1. Недостающие столбцы users и payments - разные таблицы, ALTER идут
+            # параллельно на разных соединениях пула (миграция не атомарна)
+            await self._gather_steps(
+                self._fix_users_table(adapter),
+                self._fix_payments_table(adapter),
+            )
             
-            # 2. Добавляем недостающие столбцы в payments
-            await self._fix_payments_table(adapter)
+            # 2. Индексы - после столбцов, по которым они строятся
+            # (индексы разных таблиц create_indexes и так строит параллельно)
+            await self._create_missing_indexes(adapter)
             
-            # 3. Исправляем внешние ключи
+            # 3. Внешние ключи последними: ALTER TABLE ... ADD CONSTRAINT конфликтует
+            # по блокировке с CREATE INDEX CONCURRENTLY на тех же таблицах
             await self._fix_foreign_keys(adapter)
             
-            # 4. Создаем недостающие индексы
-            await self._create_missing_indexes(adapter)
-            
             logger.info("✅ Схема БД успешно исправлена")
             
         except Exception as e:
             logger.error(f"❌ Ошибка исправления схемы БД: {e}")
             raise
     
+    async def _gather_steps(self, *steps: Awaitable[None]):
+        """Выполнить независимые шаги параллельно; ошибку первого упавшего шага
+        пробросить только после завершения остальных"""
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    
     async def _fix_users_table(self, adapter: DatabaseAdapter):
         """Исправить таблицу users"""
         logger.info("🔧 Исправляем таблицу users...")
@@ -60,15 +79,8 @@ class Migration008(Migration):
             ("registration_source", "VARCHAR(100) DEFAULT 'bot'")
         ]
         
-        for column_name, column_def in columns_to_add:
-            try:
-                await adapter.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}")
-                logger.info(f"✅ Добавлен столбец users.{column_name}")
-            except Exception as e:
-                if any(phrase in str(e).lower() for phrase in ["already exists", "duplicate column", "column already exists"]):
-                    logger.info(f"ℹ️ Столбец users.{column_name} уже существует")
-                else:
-                    logger.warning(f"⚠️ Ошибка добавления столбца users.{column_name}: {e}")
+        # Одним ALTER TABLE, уже существующие столбцы отсеиваются заранее
+        await add_columns_batch(adapter, "users", columns_to_add)
     
     async def _fix_payments_table(self, adapter: DatabaseAdapter):
         """Исправить таблицу payments"""
@@ -78,18 +90,10 @@ class Migration008(Migration):
         columns_to_add = [
             ("provider", "TEXT DEFAULT 'yookassa'"),
             ("payment_method", "VARCHAR(100)"),
-            ("metadata", "JSONB" if adapter.db_type == 'postgresql' else "TEXT")
+            ("metadata", "JSONB")
         ]
         
-        for column_name, column_def in columns_to_add:
-            try:
-                await adapter.execute(f"ALTER TABLE payments ADD COLUMN {column_name} {column_def}")
-                logger.info(f"✅ Добавлен столбец payments.{column_name}")
-            except Exception as e:
-                if any(phrase in str(e).lower() for phrase in ["already exists", "duplicate column", "column already exists"]):
-                    logger.info(f"ℹ️ Столбец payments.{column_name} уже существует")
-                else:
-                    logger.warning(f"⚠️ Ошибка добавления столбца payments.{column_name}: {e}")
+        await add_columns_batch(adapter, "payments", columns_to_add)
     
     async def _fix_foreign_keys(self, adapter: DatabaseAdapter):
         """Исправить внешние ключи"""
@@ -106,23 +110,30 @@ class Migration008(Migration):
                 ("audit_logs", "admin_user_id", "admin_users", "id")
             ]
             
+            # Существующие внешние ключи читаем одним запросом и дальше проверяем в памяти
+            existing_foreign_keys = await self._load_foreign_keys(adapter)
+            
             for table, column, ref_table, ref_column in foreign_keys_to_check:
                 try:
-                    # Проверяем существование таблиц и столбцов
-                    table_exists = await self._table_exists(adapter, table)
-                    ref_table_exists = await self._table_exists(adapter, ref_table)
+                    # Проверяем существование таблиц и столбцов по снимку схемы миграции
+                    table_exists = column in await get_existing_columns(adapter, table)
+                    ref_table_exists = ref_column in await get_existing_columns(adapter, ref_table)
                     
                     if table_exists and ref_table_exists:
                         # Проверяем существование внешнего ключа
-                        fk_exists = await self._foreign_key_exists(adapter, table, column, ref_table, ref_column)
+                        fk_exists = (table, column, ref_table, ref_column) in existing_foreign_keys
                         if not fk_exists:
-                            # Создаем внешний ключ
+                            # Создаем внешний ключ в два шага: NOT VALID держит блокировку
+                            # лишь на время записи в каталог, а просмотр существующих строк
+                            # (VALIDATE) менеджер выполнит в фоне после всех миграций
                             constraint_name = f"fk_{table}_{column}_{ref_table}_{ref_column}"
                             await adapter.execute(f"""
                                 ALTER TABLE {table} 
                                 ADD CONSTRAINT {constraint_name} 
                                 FOREIGN KEY ({column}) REFERENCES {ref_table} ({ref_column})
+                                NOT VALID
                             """)
+                            validate_constraint_later(table, constraint_name)
                             logger.info(f"✅ Создан внешний ключ {constraint_name}")
                         else:
                             logger.info(f"ℹ️ Внешний ключ {table}.{column} -> {ref_table}.{ref_column} уже существует")
@@ -169,64 +180,32 @@ class Migration008(Migration):
             ("idx_audit_logs_action", "audit_logs", "action")
         ]
         
+        # Индексы без таблицы или столбца отсеиваем заранее, без неудачных DDL
+        to_create = []
         for index_name, table_name, columns in indexes:
-            try:
-                # Проверяем существование таблицы
-                table_exists = await self._table_exists(adapter, table_name)
-                if table_exists:
-                    await adapter.execute(f"""
-                        CREATE INDEX IF NOT EXISTS {index_name} 
-                        ON {table_name} ({columns})
-                    """)
-                    logger.info(f"✅ Создан индекс {index_name}")
-                else:
-                    logger.warning(f"⚠️ Таблица {table_name} не существует, пропускаем индекс {index_name}")
-            except Exception as e:
-                logger.warning(f"⚠️ Ошибка создания индекса {index_name}: {e}")
-    
-    async def _table_exists(self, adapter: DatabaseAdapter, table_name: str) -> bool:
-        """Проверить существование таблицы"""
-        try:
-            if adapter.db_type == 'postgresql':
-                result = await adapter.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = $1
-                    )
-                """, (table_name,))
-                return bool(result)
-            else:  # SQLite
-                result = await adapter.execute("""
-                    SELECT name FROM sqlite_master 
-                    WHERE type='table' AND name=?
-                """, (table_name,))
-                return result is not None
-        except Exception:
-            return False
+            existing_columns = await get_existing_columns(adapter, table_name)
+            if not all(column.strip() in existing_columns for column in columns.split(',')):
+                logger.warning(f"⚠️ В схеме нет {table_name}({columns}), пропускаем индекс {index_name}")
+                continue
+            to_create.append((index_name, table_name, f"({columns})"))
+        
+        created = await create_indexes(adapter, to_create)
+        logger.info(f"✅ Создано индексов: {len(created)}")
     
-    async def _foreign_key_exists(self, adapter: DatabaseAdapter, table: str, column: str, ref_table: str, ref_column: str) -> bool:
-        """Проверить существование внешнего ключа"""
-        try:
-            if adapter.db_type == 'postgresql':
-                result = await adapter.execute("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu 
-                        ON tc.constraint_name = kcu.constraint_name
-                        JOIN information_schema.constraint_column_usage ccu 
-                        ON ccu.constraint_name = tc.constraint_name
-                        WHERE tc.constraint_type = 'FOREIGN KEY'
-                        AND tc.table_name = $1
-                        AND kcu.column_name = $2
-                        AND ccu.table_name = $3
-                        AND ccu.column_name = $4
-                    )
-                """, (table, column, ref_table, ref_column))
-                return bool(result)
-            return False  # Для SQLite не проверяем
-        except Exception:
-            return False
+    async def _load_foreign_keys(self, adapter: DatabaseAdapter) -> Set[Tuple[str, str, str, str]]:
+        """Все внешние ключи схемы: (таблица, столбец, таблица-цель, столбец-цель)"""
+        rows = await adapter.fetch_all("""
+            SELECT kcu.table_name, kcu.column_name,
+                   ccu.table_name AS ref_table, ccu.column_name AS ref_column
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+            JOIN information_schema.constraint_column_usage ccu
+              ON ccu.constraint_name = tc.constraint_name AND ccu.table_schema = tc.table_schema
+            WHERE tc.constraint_type = 'FOREIGN KEY'
+              AND tc.table_schema = current_schema()
+        """)
+        return {(row['table_name'], row['column_name'], row['ref_table'], row['ref_column']) for row in rows}
     
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
@@ -9,7 +9,19 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Один запрос для любого адаптера: "?" DatabaseAdapter переводит в $1 сам
+_TABLE_EXISTS_SQL = """
+    SELECT EXISTS (
+        SELECT FROM information_schema.tables 
+        WHERE table_schema = 'public' 
+        AND table_name = ?
+    )
+"""
+
 class Migration009(Migration):
+    # Ошибки отдельных ALTER/CREATE INDEX глушатся - вне общей транзакции
+    atomic = False
+
     def __init__(self):
         super().__init__("009", "Исправление проблем production_database_manager")
     
@@ -76,22 +88,10 @@ class Migration009(Migration):
     
     async def _table_exists(self, adapter: DatabaseAdapter, table_name: str) -> bool:
         """Проверить существование таблицы"""
+        # execute() вернул бы статус команды ("SELECT 1") - он всегда истинен,
+        # поэтому значение EXISTS читаем через fetch_val
         try:
-            if adapter.db_type == 'postgresql':
-                result = await adapter.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = $1
-                    )
-                """, (table_name,))
-                return bool(result)
-            else:  # SQLite
-                result = await adapter.execute("""
-                    SELECT name FROM sqlite_master 
-                    WHERE type='table' AND name=?
-                """, (table_name,))
-                return result is not None
+            return bool(await adapter.fetch_val(_TABLE_EXISTS_SQL, (table_name,)))
         except Exception:
             return False
     
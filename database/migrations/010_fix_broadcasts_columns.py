@@ -3,13 +3,22 @@
 Создана: 2025-08-04 23:12:00
 Добавляет недостающие столбцы в таблицу broadcasts для корректной работы рассылок
 """
-from database.migration_manager import Migration
+from database.migration_manager import Migration, add_columns_batch, create_indexes, get_existing_columns
 from database.db_adapter import DatabaseAdapter
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Строк broadcasts на один UPDATE при переносе message -> message_text
+_BACKFILL_BATCH_SIZE = 5000
+
+
 class Migration010(Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции,
+    # а ошибки отдельных ALTER/CREATE INDEX глушатся
+    atomic = False
+
     def __init__(self):
         super().__init__("010", "Исправление столбцов таблицы broadcasts")
     
@@ -46,39 +55,17 @@ class Migration010(Migration):
             ("failed_count", "INTEGER DEFAULT 0")
         ]
         
-        for column_name, column_def in columns_to_add:
-            try:
-                await adapter.execute(f"""
-                    ALTER TABLE broadcasts 
-                    ADD COLUMN {column_name} {column_def}
-                """)
-                logger.info(f"✅ Добавлен столбец broadcasts.{column_name}")
-            except Exception as e:
-                if any(phrase in str(e).lower() for phrase in ["already exists", "duplicate column", "column already exists"]):
-                    logger.info(f"ℹ️ Столбец broadcasts.{column_name} уже существует")
-                else:
-                    logger.warning(f"⚠️ Ошибка добавления столбца broadcasts.{column_name}: {e}")
+        # Одним ALTER TABLE, уже существующие столбцы отсеиваются заранее
+        await add_columns_batch(adapter, "broadcasts", columns_to_add)
         
         # Копируем данные из старого столбца message в новый message_text (если есть)
         try:
             # Проверяем, есть ли столбец message
+            # (execute() вернул бы статус "SELECT 0" - он истинен и без столбца)
             if adapter.db_type == 'postgresql':
-                result = await adapter.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'broadcasts' 
-                    AND column_name = 'message'
-                    AND table_schema = 'public'
-                """)
-                
-                if result:
-                    # Копируем данные из message в message_text
-                    await adapter.execute("""
-                        UPDATE broadcasts 
-                        SET message_text = message 
-                        WHERE message_text IS NULL AND message IS NOT NULL
-                    """)
-                    logger.info("✅ Данные скопированы из message в message_text")
+                if 'message' in await get_existing_columns(adapter, "broadcasts"):
+                    copied = await self._copy_message_text(adapter)
+                    logger.info(f"✅ Данные скопированы из message в message_text: {copied}")
                     
         except Exception as e:
             logger.warning(f"⚠️ Ошибка копирования данных: {e}")
@@ -91,15 +78,48 @@ class Migration010(Migration):
             ("idx_broadcasts_created_at_new", "broadcasts", "created_at")
         ]
         
+        # Индексы без столбца отсеиваем заранее, без неудачных DDL
+        existing_columns = await get_existing_columns(adapter, "broadcasts")
+        to_create = []
         for index_name, table_name, column_name in indexes:
-            try:
-                await adapter.execute(f"""
-                    CREATE INDEX IF NOT EXISTS {index_name} 
-                    ON {table_name} ({column_name})
-                """)
-                logger.info(f"✅ Создан индекс {index_name}")
-            except Exception as e:
-                logger.warning(f"⚠️ Ошибка создания индекса {index_name}: {e}")
+            if column_name not in existing_columns:
+                logger.info(f"ℹ️ Нет столбца {table_name}.{column_name}, пропускаем индекс {index_name}")
+                continue
+            to_create.append((index_name, table_name, f"({column_name})"))
+        
+        created = await create_indexes(adapter, to_create)
+        if created:
+            logger.info(f"✅ Создано индексов: {len(created)}")
+    
+    async def _copy_message_text(self, adapter: DatabaseAdapter) -> int:
+        """Перенести message в пустой message_text порциями по диапазонам id
+
+        Один UPDATE на всю таблицу держал бы блокировки строк и весь объем WAL до
+        конца; миграция не атомарна, поэтому каждая порция фиксируется отдельно.
+        Границы порций идут по первичному ключу - без повторного просмотра уже
+        обработанных строк. Возвращает число скопированных строк.
+        """
+        copied = 0
+        last_id = 0
+        while True:
+            upper_id = await adapter.fetch_val("""
+                SELECT max(id) FROM (
+                    SELECT id FROM broadcasts WHERE id > $1 ORDER BY id LIMIT $2
+                ) batch
+            """, (last_id, _BACKFILL_BATCH_SIZE))
+            if upper_id is None:
+                return copied
+            
+            status = await adapter.execute("""
+                UPDATE broadcasts 
+                SET message_text = message 
+                WHERE id > $1 AND id <= $2
+                AND message_text IS NULL AND message IS NOT NULL
+            """, (last_id, upper_id))
+            copied += int(status.split()[-1])
+            last_id = upper_id
+            # Отдаем цикл событий другим задачам между порциями
+            await asyncio.sleep(0)
     
     async def down(self, adapter: DatabaseAdapter):
         """Откатить миграцию"""
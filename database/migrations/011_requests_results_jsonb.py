@@ -0,0 +1,66 @@
+"""
+Миграция 011: Перевод requests.results в JSONB
+Создана: 2025-08-05 12:00:00
+Хранит результаты поиска как JSONB и добавляет GIN индекс для запросов по ключам (@>, ?)
+"""
+from database.migration_manager import Migration
+from database.db_adapter import DatabaseAdapter
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Migration011(Migration):
+    def __init__(self):
+        super().__init__("011", "Перевод requests.results в JSONB")
+    
+    async def up(self, adapter: DatabaseAdapter):
+        """Применить миграцию"""
+        logger.info("🔧 Переводим requests.results в JSONB...")
+        
+        try:
+            column = await adapter.fetch_one("""
+                SELECT data_type
+                FROM information_schema.columns
+                WHERE table_name = 'requests'
+                AND column_name = 'results'
+                AND table_schema = 'public'
+            """)
+            
+            if column is None:
+                # Таблицу requests создает create_tables_if_not_exist() сразу с JSONB
+                logger.info("ℹ️ Таблица requests еще не создана - пропускаем")
+                return
+            
+            if column['data_type'] != 'jsonb':
+                # Пустые строки в старых данных не являются валидным JSON
+                await adapter.execute("""
+                    ALTER TABLE requests
+                    ALTER COLUMN results TYPE JSONB
+                    USING NULLIF(results, '')::jsonb
+                """)
+                logger.info("✅ Столбец requests.results переведен в JSONB")
+            else:
+                logger.info("ℹ️ Столбец requests.results уже JSONB")
+            
+            await adapter.execute("""
+                CREATE INDEX IF NOT EXISTS idx_requests_results_gin
+                ON requests USING GIN (results jsonb_path_ops)
+            """)
+            logger.info("✅ Создан индекс idx_requests_results_gin")
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка перевода requests.results в JSONB: {e}")
+            raise
+    
+    async def down(self, adapter: DatabaseAdapter):
+        """Откатить миграцию"""
+        await adapter.execute("DROP INDEX IF EXISTS idx_requests_results_gin")
+        if await adapter.fetch_val("SELECT to_regclass('requests') IS NOT NULL"):
+            await adapter.execute("""
+                ALTER TABLE requests
+                ALTER COLUMN results TYPE TEXT
+                USING results::text
+            """)
+
+# Экспортируем класс для менеджера миграций
+Migration = Migration011
@@ -0,0 +1,57 @@
+"""
+Миграция 012: Индексы по внешним ключам
+Создана: 2025-08-05 18:00:00
+Индексирует столбцы внешних ключей и фильтров, по которым иначе идет полный просмотр таблицы
+"""
+from database.migration_manager import Migration, create_indexes, get_existing_columns
+from database.db_adapter import DatabaseAdapter
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (имя индекса, таблица, нужные столбцы, определение). Имена совпадают с индексами из
+# DatabaseAdapter.create_tables_if_not_exist(), чтобы не создавать дубликаты
+_INDEXES = (
+    # user_id - ведущий столбец составных индексов, отдельный индекс не нужен
+    ("idx_requests_user_created", "requests", ("user_id", "created_at"), "(user_id, created_at DESC)"),
+    ("idx_payments_user_status", "payments", ("user_id", "status"), "(user_id, status)"),
+    ("idx_admin_users_created_by", "admin_users", ("created_by",), "(created_by)"),
+    # Выборки активных пользователей за период (last_request > NOW() - INTERVAL ...)
+    ("idx_users_last_request", "users", ("last_request",), "(last_request)"),
+    # Частичный индекс: только подписчики
+    ("idx_users_subscription_end", "users", ("subscription_end", "is_subscribed"),
+     "(subscription_end) WHERE is_subscribed"),
+)
+
+
+class Migration012(Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    def __init__(self):
+        super().__init__("012", "Индексы по внешним ключам (requests, payments, admin_users, users)")
+
+    async def up(self, adapter: DatabaseAdapter):
+        """Применить миграцию"""
+        logger.info("🔧 Создаем индексы по внешним ключам...")
+
+        # Столбцы всех таблиц приходят из снимка схемы миграции - одним запросом к каталогу
+        to_create = []
+        for index_name, table_name, columns, definition in _INDEXES:
+            existing_columns = await get_existing_columns(adapter, table_name)
+            if not all(column in existing_columns for column in columns):
+                # Таблицу со всеми столбцами создаст create_tables_if_not_exist() вместе с индексами
+                logger.info(f"ℹ️ В схеме нет {table_name}({', '.join(columns)}) - пропускаем {index_name}")
+                continue
+
+            to_create.append((index_name, table_name, definition))
+
+        for index_name in await create_indexes(adapter, to_create):
+            logger.info(f"✅ Создан индекс {index_name}")
+
+    async def down(self, adapter: DatabaseAdapter):
+        """Откатить миграцию"""
+        await adapter.execute("DROP INDEX IF EXISTS idx_admin_users_created_by")
+
+# Экспортируем класс для менеджера миграций
+Migration = Migration012
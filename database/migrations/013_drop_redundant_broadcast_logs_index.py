@@ -0,0 +1,32 @@
+"""
+Миграция 013: Удаление лишнего индекса broadcast_logs
+Создана: 2025-08-06 12:00:00
+Индекс (broadcast_id) дублирует ведущий столбец составного (broadcast_id, status)
+и только удорожает вставку в логи рассылок
+"""
+from database.migration_manager import Migration
+from database.db_adapter import DatabaseAdapter
+
+
+class Migration013(Migration):
+    # DROP/CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    def __init__(self):
+        super().__init__("013", "Удаление индекса idx_broadcast_logs_broadcast_id (дублирует составной)")
+
+    async def up(self, adapter: DatabaseAdapter):
+        """Применить миграцию"""
+        # CONCURRENTLY - не блокируем запись логов на время удаления
+        concurrently = "" if adapter.db_type == 'sqlite' else "CONCURRENTLY "
+        await adapter.execute(f"DROP INDEX {concurrently}IF EXISTS idx_broadcast_logs_broadcast_id")
+
+    async def down(self, adapter: DatabaseAdapter):
+        """Откатить миграцию"""
+        concurrently = "" if adapter.db_type == 'sqlite' else "CONCURRENTLY "
+        await adapter.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS idx_broadcast_logs_broadcast_id ON broadcast_logs (broadcast_id)"
+        )
+
+# Экспортируем класс для менеджера миграций
+Migration = Migration013
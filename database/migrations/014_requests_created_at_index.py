@@ -0,0 +1,39 @@
+"""
+Миграция 014: Индекс requests(created_at)
+Создана: 2025-08-06 15:00:00
+Счетчик запросов за сегодня в статистике фильтрует requests по диапазону created_at
+без user_id - составной (user_id, created_at) для него не подходит
+"""
+from database.migration_manager import Migration, create_indexes, get_existing_columns
+from database.db_adapter import DatabaseAdapter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Migration014(Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    def __init__(self):
+        super().__init__("014", "Индекс requests(created_at) для статистики за день")
+
+    async def up(self, adapter: DatabaseAdapter):
+        """Применить миграцию"""
+        if "created_at" not in await get_existing_columns(adapter, "requests"):
+            # Таблицу создаст create_tables_if_not_exist() вместе с индексом
+            logger.info("ℹ️ В схеме нет requests(created_at) - пропускаем idx_requests_created_at")
+            return
+
+        for index_name in await create_indexes(adapter, [
+            ("idx_requests_created_at", "requests", "(created_at)"),
+        ]):
+            logger.info(f"✅ Создан индекс {index_name}")
+
+    async def down(self, adapter: DatabaseAdapter):
+        """Откатить миграцию"""
+        concurrently = "" if adapter.db_type == 'sqlite' else "CONCURRENTLY "
+        await adapter.execute(f"DROP INDEX {concurrently}IF EXISTS idx_requests_created_at")
+
+# Экспортируем класс для менеджера миграций
+Migration = Migration014
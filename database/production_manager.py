@@ -10,7 +10,8 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
-from .db_adapter import DatabaseAdapter
+from .db_adapter import DatabaseAdapter, as_dict
+from .universal_database import clear_user_cache
 
 logger = logging.getLogger(__name__)
 
@@ -181,6 +182,7 @@ class ProductionDatabaseManager:
 
             # Выполняем миграцию
             await migrator.migrate_all_data()
+            clear_user_cache()
 
             # Создаем файл блокировки
             await self._create_migration_lock()
@@ -482,7 +484,7 @@ class ProductionDatabaseManager:
 
             result = await adapter.fetch_one(query, (username,))
             await adapter.disconnect()
-            return result
+            return as_dict(result)
         except Exception as e:
             logger.error(f"Ошибка получения админ пользователя {username}: {e}")
             return None
@@ -4,7 +4,9 @@ Production миграции для обеспечения полной схем
 """
 import logging
 from database.db_adapter import DatabaseAdapter
+from database.migration_manager import add_columns_batch
 from database.production_manager import ProductionDatabaseManager
+from database.universal_database import clear_user_cache
 from passlib.context import CryptContext
 
 logger = logging.getLogger(__name__)
@@ -197,11 +199,7 @@ class ProductionMigrations:
         """
         await adapter.execute(query)
         
-        # Создаем индексы
-        await adapter.execute("""
-            CREATE INDEX IF NOT EXISTS idx_broadcast_logs_broadcast_id
-            ON broadcast_logs (broadcast_id)
-        """)
+        # Индекс (broadcast_id, status) покрывает и выборки по одному broadcast_id
         await adapter.execute("""
             CREATE INDEX IF NOT EXISTS idx_broadcast_logs_status
             ON broadcast_logs (broadcast_id, status)
@@ -241,15 +239,8 @@ class ProductionMigrations:
             ("registration_source", "VARCHAR(100) DEFAULT 'bot'")
         ]
         
-        for column_name, column_def in columns_to_add:
-            try:
-                await adapter.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}")
-                logger.info(f"✅ Добавлена колонка {column_name}")
-            except Exception as e:
-                if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                    logger.debug(f"Колонка {column_name} уже существует")
-                else:
-                    logger.warning(f"Ошибка добавления колонки {column_name}: {e}")
+        # ADD COLUMN IF NOT EXISTS одним ALTER, существующие столбцы отсеиваются заранее
+        await add_columns_batch(adapter, "users", columns_to_add)
     
     async def _extend_broadcasts_table(self, adapter: DatabaseAdapter):
         """Расширить таблицу рассылок"""
@@ -265,15 +256,8 @@ class ProductionMigrations:
             ("error_message", "TEXT")
         ]
         
-        for column_name, column_def in columns_to_add:
-            try:
-                await adapter.execute(f"ALTER TABLE broadcast_messages ADD COLUMN {column_name} {column_def}")
-                logger.info(f"✅ Добавлена колонка {column_name}")
-            except Exception as e:
-                if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                    logger.debug(f"Колонка {column_name} уже существует")
-                else:
-                    logger.warning(f"Ошибка добавления колонки {column_name}: {e}")
+        # ADD COLUMN IF NOT EXISTS одним ALTER, существующие столбцы отсеиваются заранее
+        await add_columns_batch(adapter, "broadcast_messages", columns_to_add)
     
     async def _insert_default_roles(self, adapter: DatabaseAdapter):
         """Вставить роли по умолчанию"""
@@ -357,6 +341,7 @@ class ProductionMigrations:
                 # Обновляем роль существующего пользователя
                 await adapter.execute("UPDATE users SET role = $1 WHERE user_id = $2", (role, user_id))
                 logger.info(f"Обновлена роль пользователя {user_id} на {role}")
+                clear_user_cache()
             else:
                 logger.info(f"Пользователь {user_id} будет создан с ролью {role} при первом обращении")
 
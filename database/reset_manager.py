@@ -12,6 +12,8 @@ from typing import Dict, Any, Optional, List
 import aiosqlite
 from pathlib import Path
 
+from database.universal_database import clear_user_cache
+
 logger = logging.getLogger(__name__)
 
 class DatabaseResetManager:
@@ -101,6 +103,7 @@ class DatabaseResetManager:
                         admin['created_at']
                     ))
                 await db.commit()
+            clear_user_cache()
         except Exception as e:
             logger.error(f"Ошибка при восстановлении админов: {e}")
     
@@ -125,6 +128,9 @@ class DatabaseResetManager:
             
             await db.commit()
             logger.info("🧹 Все таблицы очищены")
+        
+        # Удаленные пользователи не должны отдаваться из кэша get_user
+        clear_user_cache()
     
     async def _recreate_tables(self):
         """Пересоздать структуру таблиц"""
@@ -12,6 +12,7 @@ import hashlib
 import json
 
 from database.db_adapter import DatabaseAdapter
+from database.migration_manager import get_existing_columns
 
 logger = logging.getLogger(__name__)
 
@@ -227,13 +228,7 @@ class UnifiedMigrationManager:
         try:
             # Получаем список миграций
             migrations = [
-                ('create_admin_users_table', admin_migrations._create_admin_users_table),
-                ('create_roles_table', admin_migrations._create_roles_table),
-                ('create_message_templates_table', admin_migrations._create_message_templates_table),
-                ('create_scheduled_broadcasts_table', admin_migrations._create_scheduled_broadcasts_table),
-                ('create_audit_logs_table', admin_migrations._create_audit_logs_table),
-                ('create_ab_tests_table', admin_migrations._create_ab_tests_table),
-                ('create_broadcast_logs_table', admin_migrations._create_broadcast_logs_table),
+                ('create_all_tables', admin_migrations._create_all_tables),
                 ('extend_users_table', admin_migrations._extend_users_table),
                 ('extend_broadcasts_table', admin_migrations._extend_broadcasts_table),
                 ('add_status_to_broadcasts', admin_migrations._add_status_to_broadcasts),
@@ -251,9 +246,12 @@ class UnifiedMigrationManager:
             for migration_name, migration_func in migrations:
                 if migration_name not in executed_migrations:
                     try:
-                        # Адаптируем функцию для работы с PostgreSQL
-                        await self._execute_adapted_migration(adapter, migration_func, migration_name)
-                        await self._mark_migration_executed(adapter, migration_name)
+                        # Как точка сохранения в AdminMigrations: ошибка откатывает
+                        # только эту миграцию вместе с отметкой о ней
+                        async with adapter.transaction():
+                            # Адаптируем функцию для работы с PostgreSQL
+                            await self._execute_adapted_migration(adapter, migration_func, migration_name)
+                            await self._mark_migration_executed(adapter, migration_name)
                         logger.info(f"✅ Миграция {migration_name} выполнена успешно")
                         migrations_executed += 1
                     except Exception as e:
@@ -309,9 +307,16 @@ class UnifiedMigrationManager:
                     # Адаптируем SQLite запросы для PostgreSQL
                     adapted_query = self._adapt_query(query)
                     return await self.adapter.execute(adapted_query, params)
+
+                async def executemany(self, query, params_seq):
+                    return await self.adapter.execute_many(self._adapt_query(query), params_seq)
+                
+                async def existing_columns(self, table):
+                    # Вместо pragma_table_info SQLite - каталог PostgreSQL
+                    return await get_existing_columns(self.adapter, table)
                 
                 async def commit(self):
-                    # PostgreSQL автоматически коммитит
+                    # Транзакцией миграции управляет adapter.transaction()
                     pass
                 
                 def _adapt_query(self, query):
@@ -342,6 +347,12 @@ class UnifiedMigrationManager:
                 
                 async def execute(self, query, params=None):
                     return await self.adapter.execute(query, params)
+
+                async def executemany(self, query, params_seq):
+                    return await self.adapter.execute_many(query, params_seq)
+                
+                async def existing_columns(self, table):
+                    return await get_existing_columns(self.adapter, table)
                 
                 async def commit(self):
                     pass
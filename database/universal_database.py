@@ -5,6 +5,7 @@
 
 import os
 import json
+import time
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
@@ -13,6 +14,58 @@ from .db_adapter import DatabaseAdapter
 
 logger = logging.getLogger(__name__)
 
+# Кэш строк users для get_user: бот читает одного и того же пользователя на каждое
+# сообщение. Общий для всех экземпляров в процессе - запись через любой из них
+# сбрасывает строку в кэше. Массовые записи мимо UniversalDatabase (сброс базы, перенос
+# данных, назначение ролей) вызывают clear_user_cache(), прочие видны не позже чем через TTL
+_USER_CACHE_TTL = 30
+_USER_CACHE_MAX_SIZE = 10_000
+_user_cache: Dict[tuple, tuple] = {}
+
+
+def clear_user_cache():
+    """Сбросить весь кэш пользователей после записи в users мимо UniversalDatabase"""
+    _user_cache.clear()
+
+
+# Запросы, которые выполняются на каждое сообщение боту. Текст постоянный, поэтому
+# asyncpg подготавливает каждый один раз на соединение пула и дальше берет план
+# из своего кэша (statement_cache_size в DatabaseAdapter)
+_GET_USER_SQL = "SELECT * FROM users WHERE user_id = $1"
+_UPDATE_USER_REQUESTS_SQL = """
+    UPDATE users
+    SET requests_used = requests_used + 1, last_request = $1
+    WHERE user_id = $2
+"""
+_CHECK_SUBSCRIPTION_SQL = """
+    SELECT is_subscribed AND (subscription_end IS NULL OR subscription_end > $2)
+    FROM users WHERE user_id = $1
+"""
+_CAN_MAKE_REQUEST_SQL = """
+    SELECT blocked, bot_blocked, role, requests_used,
+           is_subscribed AND (subscription_end IS NULL OR subscription_end > $2) AS is_active
+    FROM users WHERE user_id = $1
+"""
+_SAVE_REQUEST_SQL = """
+    INSERT INTO requests (user_id, channels_input, results)
+    VALUES ($1, $2, $3)
+"""
+
+_STATS_SQL = """
+    SELECT
+        COUNT(*) AS total_users,
+        COUNT(*) FILTER (
+            WHERE is_subscribed AND (subscription_end IS NULL OR subscription_end > NOW())
+        ) AS active_subscribers,
+        COUNT(*) FILTER (WHERE unlimited_access) AS unlimited_users,
+        COUNT(*) FILTER (WHERE blocked OR bot_blocked) AS blocked_users,
+        (
+            SELECT COUNT(*) FROM requests
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1
+        ) AS requests_today
+    FROM users
+"""
+
 
 class UniversalDatabase:
     """Универсальный класс для работы с базой данных через DatabaseAdapter"""
@@ -22,13 +75,24 @@ class UniversalDatabase:
         if not self.database_url:
             raise ValueError("DATABASE_URL обязательна! Укажите PostgreSQL URL в переменных окружения.")
         self.adapter = DatabaseAdapter(self.database_url)
+        # Адаптер общий для всех обработчиков: disconnect() в методах не закрывает пул
+        self.adapter.keep_pool_open = True
         self._connection_pool = None
 
+    async def close(self):
+        """Закрыть пул соединений при остановке приложения"""
+        await self.adapter.close()
+
+    def invalidate_user_cache(self, *user_ids: int):
+        """Сбросить закэшированные строки пользователей после записи в users"""
+        for user_id in user_ids:
+            _user_cache.pop((self.database_url, user_id), None)
+
     async def get_connection(self):
-        """Получить соединение с базой данных"""
-        if not self.adapter.connection or self.adapter.connection.is_closed():
+        """Получить пул соединений с базой данных"""
+        if not self.adapter.is_connected:
             await self.adapter.connect()
-        return self.adapter.connection
+        return self.adapter.connection_pool
 
     def _extract_count(self, result) -> int:
         """Извлечь значение COUNT из результата PostgreSQL"""
@@ -67,19 +131,31 @@ class UniversalDatabase:
     async def get_user(self, user_id: int) -> Optional[dict]:
         """Получить пользователя"""
         try:
-            await self.adapter.connect()
+            # Внутри транзакции читаем мимо кэша: строка может быть еще не закоммичена
+            use_cache = not self.adapter.in_transaction
+            key = (self.database_url, user_id)
+            if use_cache:
+                cached = _user_cache.get(key)
+                if cached and time.monotonic() - cached[0] < _USER_CACHE_TTL:
+                    return dict(cached[1])
             
-            if self.adapter.db_type == 'sqlite':
-                query = "SELECT * FROM users WHERE user_id = ?"
-                params = (user_id,)
-            else:  # PostgreSQL
-                query = "SELECT * FROM users WHERE user_id = $1"
-                params = (user_id,)
+            await self.adapter.connect()
             
-            result = await self.adapter.fetch_one(query, params)
+            result = await self.adapter.fetch_one(_GET_USER_SQL, (user_id,))
             await self.adapter.disconnect()
             
-            return dict(result) if result else None
+            if not result:
+                return None
+            
+            user = dict(result)
+            if use_cache:
+                _user_cache.pop(key, None)
+                if len(_user_cache) >= _USER_CACHE_MAX_SIZE:
+                    # Порядок вставки = возраст записи: вытесняем самую старую
+                    del _user_cache[next(iter(_user_cache))]
+                _user_cache[key] = (time.monotonic(), user)
+            # Копия: вызывающий код может менять словарь, не задевая кэш
+            return dict(user)
             
         except Exception as e:
             logger.error(f"Ошибка получения пользователя {user_id}: {e}")
@@ -122,6 +198,7 @@ class UniversalDatabase:
                 params = (user_id, username, first_name, last_name, datetime.now(), role)
             
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             await self.adapter.disconnect()
             
         except Exception as e:
@@ -134,25 +211,12 @@ class UniversalDatabase:
     async def check_subscription(self, user_id: int) -> bool:
         """Проверить активность подписки"""
         try:
-            user = await self.get_user(user_id)
-            if not user:
-                return False
-            
-            # Проверяем is_subscribed
-            is_subscribed = user.get('is_subscribed', False)
-            if not is_subscribed:
-                return False
-            
-            # Проверяем дату окончания подписки
-            subscription_end = user.get('subscription_end')
-            if subscription_end:
-                if isinstance(subscription_end, str):
-                    end_date = datetime.fromisoformat(subscription_end.replace('Z', '+00:00'))
-                else:
-                    end_date = subscription_end
-                return datetime.now() < end_date
-            
-            return True
+            await self.adapter.connect()
+            # Одно значение вместо всей строки users; None - пользователя нет
+            is_active = await self.adapter.fetch_val(
+                _CHECK_SUBSCRIPTION_SQL, (user_id, datetime.now())
+            )
+            return bool(is_active)
             
         except Exception as e:
             logger.error(f"Ошибка проверки подписки для {user_id}: {e}")
@@ -183,6 +247,7 @@ class UniversalDatabase:
                 params = (end_date, datetime.now(), provider, user_id)
             
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             await self.adapter.disconnect()
             
         except Exception as e:
@@ -197,23 +262,9 @@ class UniversalDatabase:
         try:
             await self.adapter.connect()
             
-            if self.adapter.db_type == 'sqlite':
-                query = """
-                    UPDATE users
-                    SET requests_used = requests_used + 1, last_request = ?
-                    WHERE user_id = ?
-                """
-                params = (datetime.now(), user_id)
-            else:  # PostgreSQL
-                # Используем last_request для совместимости с админ-панелью
-                query = """
-                    UPDATE users
-                    SET requests_used = requests_used + 1, last_request = $1
-                    WHERE user_id = $2
-                """
-                params = (datetime.now(), user_id)
-            
-            await self.adapter.execute(query, params)
+            # Используем last_request для совместимости с админ-панелью
+            await self.adapter.execute(_UPDATE_USER_REQUESTS_SQL, (datetime.now(), user_id))
+            self.invalidate_user_cache(user_id)
             await self.adapter.disconnect()
             
         except Exception as e:
@@ -228,30 +279,33 @@ class UniversalDatabase:
         try:
             from bot.utils.roles import TelegramUserPermissions
 
-            user = await self.get_user(user_id)
+            await self.adapter.connect()
+            # Блокировки, роль, подписка и счетчик - одной строкой вместо get_user + check_subscription
+            user = await self.adapter.fetch_one(
+                _CAN_MAKE_REQUEST_SQL, (user_id, datetime.now())
+            )
             if not user:
                 return True  # Новый пользователь
 
             # Проверяем блокировку администратором
-            if user.get('blocked', False):
+            if user['blocked']:
                 return False
 
             # Проверяем, заблокировал ли пользователь бота
-            if user.get('bot_blocked', False):
+            if user['bot_blocked']:
                 return False
 
             # Проверяем роль пользователя - администраторы имеют безлимитный доступ
-            user_role = user.get('role', 'user')
+            user_role = user['role'] or 'user'
             if TelegramUserPermissions.has_unlimited_access(user_id, user_role):
                 return True
 
             # Проверяем подписку
-            if await self.check_subscription(user_id):
+            if user['is_active']:
                 return True
 
             # Проверяем лимит бесплатных запросов
-            requests_used = user.get('requests_used', 0)
-            return requests_used < free_limit
+            return (user['requests_used'] or 0) < free_limit
             
         except Exception as e:
             logger.error(f"Ошибка проверки возможности запроса для {user_id}: {e}")
@@ -262,20 +316,10 @@ class UniversalDatabase:
         try:
             await self.adapter.connect()
             
-            if self.adapter.db_type == 'sqlite':
-                query = """
-                    INSERT INTO requests (user_id, channels_input, results)
-                    VALUES (?, ?, ?)
-                """
-                params = (user_id, json.dumps(channels_input), json.dumps(results))
-            else:  # PostgreSQL
-                query = """
-                    INSERT INTO requests (user_id, channels_input, results)
-                    VALUES ($1, $2, $3)
-                """
-                params = (user_id, json.dumps(channels_input), json.dumps(results))
-            
-            await self.adapter.execute(query, params)
+            # results - JSONB, сериализуется кодеком соединения
+            await self.adapter.execute(
+                _SAVE_REQUEST_SQL, (user_id, json.dumps(channels_input), results)
+            )
             await self.adapter.disconnect()
             
         except Exception as e:
@@ -290,61 +334,10 @@ class UniversalDatabase:
         try:
             await self.adapter.connect()
 
-            stats = {}
-
-            # Общее количество пользователей
-            total_users_result = await self.adapter.fetch_one("SELECT COUNT(*) FROM users")
-            stats['total_users'] = self._extract_count(total_users_result)
-
-            # Активные подписчики
-            if self.adapter.db_type == 'sqlite':
-                active_subs_query = """
-                    SELECT COUNT(*) FROM users
-                    WHERE is_subscribed = 1
-                    AND (subscription_end IS NULL OR subscription_end > datetime('now'))
-                """
-            else:  # PostgreSQL
-                active_subs_query = """
-                    SELECT COUNT(*) FROM users
-                    WHERE is_subscribed = TRUE
-                    AND (subscription_end IS NULL OR subscription_end > NOW())
-                """
-
-            active_subs_result = await self.adapter.fetch_one(active_subs_query)
-            stats['active_subscribers'] = self._extract_count(active_subs_result)
-
-            # Безлимитные пользователи
-            if self.adapter.db_type == 'sqlite':
-                unlimited_query = "SELECT COUNT(*) FROM users WHERE unlimited_access = 1"
-            else:  # PostgreSQL
-                unlimited_query = "SELECT COUNT(*) FROM users WHERE unlimited_access = TRUE"
-
-            unlimited_result = await self.adapter.fetch_one(unlimited_query)
-            stats['unlimited_users'] = self._extract_count(unlimited_result)
-
-            # Заблокированные пользователи
-            if self.adapter.db_type == 'sqlite':
-                blocked_query = "SELECT COUNT(*) FROM users WHERE blocked = 1 OR bot_blocked = 1"
-            else:  # PostgreSQL
-                blocked_query = "SELECT COUNT(*) FROM users WHERE blocked = TRUE OR bot_blocked = TRUE"
-
-            blocked_result = await self.adapter.fetch_one(blocked_query)
-            stats['blocked_users'] = self._extract_count(blocked_result)
-
-            # Запросы за сегодня
-            if self.adapter.db_type == 'sqlite':
-                requests_today_query = """
-                    SELECT COUNT(*) FROM requests
-                    WHERE created_at >= date('now')
-                """
-            else:  # PostgreSQL
-                requests_today_query = """
-                    SELECT COUNT(*) FROM requests
-                    WHERE created_at >= CURRENT_DATE
-                """
-
-            requests_today_result = await self.adapter.fetch_one(requests_today_query)
-            stats['requests_today'] = self._extract_count(requests_today_result)
+            # Все счетчики - одним запросом: users просматривается один раз (FILTER),
+            # запросы за сегодня - диапазоном по created_at, чтобы работал индекс
+            row = await self.adapter.fetch_one(_STATS_SQL)
+            stats = dict(row)
 
             await self.adapter.disconnect()
             return stats
@@ -362,9 +355,10 @@ class UniversalDatabase:
         try:
             from bot.utils.roles import TelegramUserPermissions
 
-            user = await self.get_user(user_id)
-            if user and 'role' in user:
-                return user['role']
+            await self.adapter.connect()
+            role = await self.adapter.fetch_val("SELECT role FROM users WHERE user_id = $1", (user_id,))
+            if role is not None:
+                return role
 
             # Возвращаем роль по умолчанию или предопределенную
             return TelegramUserPermissions.get_user_role(user_id)
@@ -379,15 +373,9 @@ class UniversalDatabase:
         """Получить общее количество пользователей"""
         try:
             await self.adapter.connect()
-            result = await self.adapter.fetch_one("SELECT COUNT(*) FROM users")
+            count = await self.adapter.fetch_val("SELECT COUNT(*) FROM users")
             await self.adapter.disconnect()
-
-            if result is not None:
-                count = self._extract_count(result)
-
-                # Преобразуем в int
-                return int(count) if count is not None else 0
-            return 0
+            return count or 0
 
         except Exception as e:
             logger.error(f"Ошибка получения количества пользователей: {e}")
@@ -415,10 +403,9 @@ class UniversalDatabase:
                     AND (subscription_end IS NULL OR subscription_end > NOW())
                 """
 
-            result = await self.adapter.fetch_one(query)
+            count = await self.adapter.fetch_val(query)
             await self.adapter.disconnect()
-
-            return self._extract_count(result)
+            return count or 0
 
         except Exception as e:
             logger.error(f"Ошибка получения количества подписчиков: {e}")
@@ -432,9 +419,9 @@ class UniversalDatabase:
         """Получить общее количество запросов"""
         try:
             await self.adapter.connect()
-            result = await self.adapter.fetch_one("SELECT COUNT(*) FROM requests")
+            count = await self.adapter.fetch_val("SELECT COUNT(*) FROM requests")
             await self.adapter.disconnect()
-            return self._extract_count(result)
+            return count or 0
         except Exception as e:
             logger.error(f"Ошибка получения количества запросов: {e}")
             try:
@@ -460,9 +447,9 @@ class UniversalDatabase:
                     WHERE last_request > NOW() - INTERVAL '30 days'
                 """
 
-            result = await self.adapter.fetch_one(query)
+            count = await self.adapter.fetch_val(query)
             await self.adapter.disconnect()
-            return self._extract_count(result)
+            return count or 0
 
         except Exception as e:
             logger.error(f"Ошибка получения количества активных пользователей: {e}")
@@ -485,20 +472,8 @@ class UniversalDatabase:
             results = await self.adapter.fetch_all(query)
             await self.adapter.disconnect()
 
-            if results:
-                user_list = []
-                for row in results:
-                    if isinstance(row, dict):
-                        user_id = row.get('user_id')
-                    elif hasattr(row, '__getitem__'):
-                        user_id = row[0]
-                    else:
-                        user_id = getattr(row, 'user_id', None)
-
-                    if user_id:
-                        user_list.append({'user_id': user_id})
-                return user_list
-            return []
+            # Записи asyncpg отдаем как есть: user['user_id'] работает без копирования в dict
+            return [row for row in results if row['user_id']] if results else []
 
         except Exception as e:
             logger.error(f"Ошибка получения пользователей для рассылки: {e}")
@@ -528,20 +503,8 @@ class UniversalDatabase:
             results = await self.adapter.fetch_all(query)
             await self.adapter.disconnect()
 
-            if results:
-                user_list = []
-                for row in results:
-                    if isinstance(row, dict):
-                        user_id = row.get('user_id')
-                    elif hasattr(row, '__getitem__'):
-                        user_id = row[0]
-                    else:
-                        user_id = getattr(row, 'user_id', None)
-
-                    if user_id:
-                        user_list.append({'user_id': user_id})
-                return user_list
-            return []
+            # Записи asyncpg отдаем как есть: user['user_id'] работает без копирования в dict
+            return [row for row in results if row['user_id']] if results else []
 
         except Exception as e:
             logger.error(f"Ошибка получения активных пользователей для рассылки: {e}")
@@ -572,20 +535,8 @@ class UniversalDatabase:
             results = await self.adapter.fetch_all(query)
             await self.adapter.disconnect()
 
-            if results:
-                user_list = []
-                for row in results:
-                    if isinstance(row, dict):
-                        user_id = row.get('user_id')
-                    elif hasattr(row, '__getitem__'):
-                        user_id = row[0]
-                    else:
-                        user_id = getattr(row, 'user_id', None)
-
-                    if user_id:
-                        user_list.append({'user_id': user_id})
-                return user_list
-            return []
+            # Записи asyncpg отдаем как есть: user['user_id'] работает без копирования в dict
+            return [row for row in results if row['user_id']] if results else []
 
         except Exception as e:
             logger.error(f"Ошибка получения подписчиков для рассылки: {e}")
@@ -672,6 +623,7 @@ class UniversalDatabase:
                 params = (datetime.now(), user_id)
 
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             await self.adapter.disconnect()
 
         except Exception as e:
@@ -893,51 +845,37 @@ class UniversalDatabase:
         try:
             await self.adapter.connect()
             
-            # Получаем информацию о платеже
-            payment = await self.get_payment(payment_id=payment_id)
-            if not payment:
-                logger.error(f"Платеж {payment_id} не найден")
-                return False
+            now = datetime.now()
             
-            # Обновляем статус платежа
-            if self.adapter.db_type == 'sqlite':
-                query = """
-                    UPDATE payments 
-                    SET status = 'completed', provider_payment_id = ?, completed_at = ?
-                    WHERE payment_id = ?
-                """
-                params = (provider_payment_id, datetime.now(), payment_id)
-            else:  # PostgreSQL
-                query = """
-                    UPDATE payments 
+            # Статус платежа и подписка меняются вместе: одна транзакция, один COMMIT
+            async with self.adapter.transaction():
+                # RETURNING отдает пользователя и срок без отдельного SELECT платежа
+                payment = await self.adapter.fetch_one(
+                    """
+                    UPDATE payments
                     SET status = 'completed', provider_payment_id = $1, completed_at = $2
                     WHERE payment_id = $3
-                """
-                params = (provider_payment_id, datetime.now(), payment_id)
-            
-            await self.adapter.execute(query, params)
-            
-            # Активируем подписку пользователю
-            end_date = datetime.now() + timedelta(days=30 * payment['subscription_months'])
-            
-            if self.adapter.db_type == 'sqlite':
-                sub_query = """
-                    UPDATE users
-                    SET is_subscribed = TRUE, subscription_end = ?,
-                        last_payment_date = ?, payment_provider = 'yookassa'
-                    WHERE user_id = ?
-                """
-                sub_params = (end_date, datetime.now(), payment['user_id'])
-            else:  # PostgreSQL
-                sub_query = """
+                    RETURNING user_id, subscription_months
+                    """,
+                    (provider_payment_id, now, payment_id)
+                )
+                if not payment:
+                    logger.error(f"Платеж {payment_id} не найден")
+                    return False
+                
+                # Активируем подписку пользователю
+                end_date = now + timedelta(days=30 * payment['subscription_months'])
+                await self.adapter.execute(
+                    """
                     UPDATE users
                     SET is_subscribed = TRUE, subscription_end = $1,
                         last_payment_date = $2, payment_provider = 'yookassa'
                     WHERE user_id = $3
-                """
-                sub_params = (end_date, datetime.now(), payment['user_id'])
-            
-            await self.adapter.execute(sub_query, sub_params)
+                    """,
+                    (end_date, now, payment['user_id'])
+                )
+            # После COMMIT: иначе get_user успел бы закэшировать строку до подписки
+            self.invalidate_user_cache(payment['user_id'])
             return True
             
         except Exception as e:
@@ -1029,34 +967,30 @@ class UniversalDatabase:
             
             where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
-            # Получаем общее количество
-            if self.adapter.db_type == 'sqlite':
-                count_query = f"SELECT COUNT(*) FROM users{where_clause}"
-                query = f"""
-                    SELECT * FROM users{where_clause}
-                    ORDER BY created_at DESC
-                    LIMIT ? OFFSET ?
-                """
-                query_params = params + [per_page, offset]
-            else:  # PostgreSQL
-                # Конвертируем параметры для PostgreSQL
-                pg_where_clause = where_clause
-                for i, _ in enumerate(params):
-                    pg_where_clause = pg_where_clause.replace('?', f'${i+1}', 1)
-                
-                count_query = f"SELECT COUNT(*) FROM users{pg_where_clause}"
-                query = f"""
-                    SELECT * FROM users{pg_where_clause}
-                    ORDER BY created_at DESC
-                    LIMIT ${len(params)+1} OFFSET ${len(params)+2}
-                """
-                query_params = params + [per_page, offset]
+            # Страница и общее количество - одним запросом: COUNT(*) OVER() считается
+            # по всей выборке до LIMIT. Плейсхолдеры ? переводит в $n адаптер
+            query = f"""
+                SELECT *, COUNT(*) OVER() AS total_count FROM users{where_clause}
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            """
+            results = await self.adapter.fetch_all(query, tuple(params + [per_page, offset]))
             
-            count_result = await self.adapter.fetch_one(count_query, params)
-            total = self._extract_count(count_result)
+            users = []
+            for row in results:
+                user = dict(row)
+                user.pop('total_count', None)
+                users.append(user)
             
-            results = await self.adapter.fetch_all(query, query_params)
-            users = [dict(row) for row in results] if results else []
+            if results:
+                total = results[0]['total_count']
+            elif page > 1:
+                # Страница за пределами выборки - строк нет, общее количество отдельным запросом
+                total = await self.adapter.fetch_val(
+                    f"SELECT COUNT(*) FROM users{where_clause}", tuple(params)
+                ) or 0
+            else:
+                total = 0
             
             return {
                 'users': users,
@@ -1181,46 +1115,48 @@ class UniversalDatabase:
                 pass
 
     async def delete_user(self, user_id: int) -> bool:
-        """Удалить пользователя"""
-        try:
-            await self.adapter.connect()
-            
-            if self.adapter.db_type == 'sqlite':
-                query = "DELETE FROM users WHERE user_id = ?"
-                params = (user_id,)
-            else:  # PostgreSQL
-                query = "DELETE FROM users WHERE user_id = $1"
-                params = (user_id,)
-            
-            await self.adapter.execute(query, params)
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка удаления пользователя: {e}")
-            return False
-        finally:
-            try:
-                await self.adapter.disconnect()
-            except:
-                pass
+        """Удалить пользователя вместе с его запросами"""
+        result = await self.bulk_delete_users([user_id])
+        return bool(result['success'])
+
+    async def bulk_delete_users(self, user_ids: List[int]) -> dict:
+        """Массовое удаление пользователей вместе с их запросами
+
+        Весь список - в одной транзакции и тремя запросами на любое число id.
+        Успешными считаются id, которые были в users; при ошибке транзакция
+        откатывается и все id попадают в failed.
+        """
+        results = {"success": [], "failed": []}
+        if not user_ids:
+            return results
 
-    async def bulk_delete_users(self, user_ids: List[int]) -> bool:
-        """Массовое удаление пользователей"""
         try:
             await self.adapter.connect()
-            
-            if not user_ids:
-                return True
-            
-            placeholders = ','.join(['?' if self.adapter.db_type == 'sqlite' else f'${i+1}' for i in range(len(user_ids))])
-            query = f"DELETE FROM users WHERE user_id IN ({placeholders})"
-            
-            await self.adapter.execute(query, user_ids)
-            return True
-            
+
+            async with self.adapter.transaction():
+                # FOR UPDATE: параллельное удаление тех же id дождется этой транзакции
+                rows = await self.adapter.fetch_all(
+                    "SELECT user_id FROM users WHERE user_id = ANY($1::bigint[]) FOR UPDATE",
+                    (list(user_ids),)
+                )
+                existing = [row['user_id'] for row in rows]
+                if existing:
+                    await self.adapter.execute(
+                        "DELETE FROM requests WHERE user_id = ANY($1::bigint[])", (existing,)
+                    )
+                    await self.adapter.execute(
+                        "DELETE FROM users WHERE user_id = ANY($1::bigint[])", (existing,)
+                    )
+
+            self.invalidate_user_cache(*existing)
+            existing = set(existing)
+            for user_id in dict.fromkeys(user_ids):
+                results["success" if user_id in existing else "failed"].append(user_id)
+            return results
+
         except Exception as e:
             logger.error(f"Ошибка массового удаления пользователей: {e}")
-            return False
+            return {"success": [], "failed": list(user_ids)}
         finally:
             try:
                 await self.adapter.disconnect()
@@ -1268,6 +1204,7 @@ class UniversalDatabase:
                 params.append(user_id)
             
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
             
         except Exception as e:
@@ -1292,6 +1229,7 @@ class UniversalDatabase:
                 params = (role, user_id)
             
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
             
         except Exception as e:
@@ -1719,7 +1657,7 @@ class UniversalDatabase:
         """Получить детальную статистику рассылки с production-ready обработкой ошибок"""
         try:
             # Проверяем и переподключаемся при необходимости
-            if not self.adapter.connection or self.adapter.connection.is_closed():
+            if not self.adapter.is_connected:
                 await self.adapter.connect()
 
             # Основная информация о рассылке
@@ -1910,7 +1848,7 @@ class UniversalDatabase:
         """Логировать доставку сообщения рассылки"""
         try:
             # Проверяем и переподключаемся при необходимости
-            if not self.adapter.connection or self.adapter.connection.is_closed():
+            if not self.adapter.is_connected:
                 await self.adapter.connect()
 
             if self.adapter.db_type == 'sqlite':
@@ -2136,23 +2074,9 @@ class UniversalDatabase:
                     query = pg_query
 
             results = await self.adapter.fetch_all(query, params)
-            users = []
-
-            if results:
-                for row in results:
-                    if hasattr(row, '_asdict'):
-                        users.append(row._asdict())
-                    elif hasattr(row, 'keys'):
-                        users.append(dict(row))
-                    else:
-                        users.append({
-                            'user_id': row[0],
-                            'username': row[1],
-                            'first_name': row[2],
-                            'last_name': row[3]
-                        })
 
-            return users
+            # Записи asyncpg отдаем как есть, без построчного копирования в dict
+            return list(results) if results else []
 
         except Exception as e:
             logger.error(f"Ошибка получения целевых пользователей: {e}")
@@ -2543,6 +2467,7 @@ class UniversalDatabase:
                 params = (user_id,)
 
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
 
         except Exception as e:
@@ -2567,6 +2492,7 @@ class UniversalDatabase:
                 params = (blocked, user_id)
 
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
 
         except Exception as e:
@@ -2591,6 +2517,7 @@ class UniversalDatabase:
                 params = (user_id,)
 
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
 
         except Exception as e:
@@ -2607,7 +2534,7 @@ class UniversalDatabase:
         connection_opened = False
         try:
             # Проверяем, есть ли уже соединение
-            if not self.adapter.connection or self.adapter.connection.is_closed():
+            if not self.adapter.is_connected:
                 await self.adapter.connect()
                 connection_opened = True
 
@@ -2736,6 +2663,7 @@ class UniversalDatabase:
                 params = (is_subscribed, subscription_end, user_id)
 
             await self.adapter.execute(query, params)
+            self.invalidate_user_cache(user_id)
             return True
 
         except Exception as e:
@@ -1,6 +1,7 @@
 """
 Вторая часть универсальных миграций
 """
+from database.migration_manager import add_columns_batch
 
 async def _create_ab_tests_table(self, adapter):
     """Создать таблицу A/B тестов"""
@@ -78,11 +79,7 @@ async def _create_broadcast_logs_table(self, adapter):
         """
     await adapter.execute(query)
     
-    # Создаем индексы
-    await adapter.execute("""
-        CREATE INDEX IF NOT EXISTS idx_broadcast_logs_broadcast_id
-        ON broadcast_logs (broadcast_id)
-    """)
+    # Индекс (broadcast_id, status) покрывает и выборки по одному broadcast_id
     await adapter.execute("""
         CREATE INDEX IF NOT EXISTS idx_broadcast_logs_status
         ON broadcast_logs (broadcast_id, status)
@@ -120,8 +117,9 @@ async def _create_user_permissions_table(self, adapter):
 
 async def _extend_users_table(self, adapter):
     """Расширить таблицу пользователей"""
+    # Типы PostgreSQL, для SQLite их переводит add_columns_batch()
     columns_to_add = [
-        ("role", "TEXT DEFAULT 'user'" if adapter.db_type == 'sqlite' else "VARCHAR(100) DEFAULT 'user'"),
+        ("role", "VARCHAR(100) DEFAULT 'user'"),
         ("unlimited_access", "BOOLEAN DEFAULT FALSE"),
         ("notes", "TEXT"),
         ("blocked", "BOOLEAN DEFAULT FALSE"),
@@ -129,17 +127,10 @@ async def _extend_users_table(self, adapter):
         ("blocked_at", "TIMESTAMP"),
         ("blocked_by", "INTEGER"),
         ("referrer_id", "INTEGER"),
-        ("registration_source", "TEXT DEFAULT 'bot'" if adapter.db_type == 'sqlite' else "VARCHAR(100) DEFAULT 'bot'")
+        ("registration_source", "VARCHAR(100) DEFAULT 'bot'")
     ]
     
-    for column_name, column_def in columns_to_add:
-        try:
-            await adapter.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}")
-        except Exception as e:
-            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                continue  # Колонка уже существует
-            else:
-                print(f"Ошибка добавления колонки {column_name}: {e}")
+    await add_columns_batch(adapter, "users", columns_to_add)
 
 async def _extend_broadcasts_table(self, adapter):
     """Расширить таблицу рассылок"""
@@ -151,8 +142,8 @@ async def _extend_broadcasts_table(self, adapter):
     
     columns_to_add = [
         ("template_id", "INTEGER"),
-        ("parse_mode", "TEXT DEFAULT 'HTML'" if adapter.db_type == 'sqlite' else "VARCHAR(50) DEFAULT 'HTML'"),
-        ("target_users", "TEXT DEFAULT 'all'" if adapter.db_type == 'sqlite' else "VARCHAR(100) DEFAULT 'all'"),
+        ("parse_mode", "VARCHAR(50) DEFAULT 'HTML'"),
+        ("target_users", "VARCHAR(100) DEFAULT 'all'"),
         ("created_by", "INTEGER"),
         ("ab_test_id", "INTEGER"),
         ("scheduled_at", "TIMESTAMP"),
@@ -160,44 +151,17 @@ async def _extend_broadcasts_table(self, adapter):
         ("error_message", "TEXT")
     ]
     
-    for column_name, column_def in columns_to_add:
-        try:
-            await adapter.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_def}")
-        except Exception as e:
-            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-                continue  # Колонка уже существует
-            else:
-                print(f"Ошибка добавления колонки {column_name} в {table_name}: {e}")
+    await add_columns_batch(adapter, table_name, columns_to_add)
 
 async def _add_status_to_broadcasts(self, adapter):
     """Добавить статус к рассылкам"""
     table_name = "broadcasts" if adapter.db_type == 'sqlite' else "broadcast_messages"
-    column_def = "TEXT DEFAULT 'pending'" if adapter.db_type == 'sqlite' else "VARCHAR(50) DEFAULT 'pending'"
-    
-    try:
-        await adapter.execute(f"ALTER TABLE {table_name} ADD COLUMN status {column_def}")
-    except Exception as e:
-        if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-            pass  # Колонка уже существует
-        else:
-            print(f"Ошибка добавления колонки status: {e}")
+    await add_columns_batch(adapter, table_name, [("status", "VARCHAR(50) DEFAULT 'pending'")])
 
 async def _add_title_to_broadcasts(self, adapter):
     """Добавить заголовок к рассылкам"""
-    if adapter.db_type == 'sqlite':
-        table_name = "broadcasts"
-        column_def = "TEXT"
-    else:  # PostgreSQL
-        table_name = "broadcast_messages"
-        column_def = "VARCHAR(255)"
-    
-    try:
-        await adapter.execute(f"ALTER TABLE {table_name} ADD COLUMN title {column_def}")
-    except Exception as e:
-        if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
-            pass  # Колонка уже существует
-        else:
-            print(f"Ошибка добавления колонки title: {e}")
+    table_name = "broadcasts" if adapter.db_type == 'sqlite' else "broadcast_messages"
+    await add_columns_batch(adapter, table_name, [("title", "VARCHAR(255)")])
 
 async def _insert_default_roles(self, adapter):
     """Вставить роли по умолчанию"""
@@ -126,6 +126,13 @@ async def main():
     db = UniversalDatabase(db_manager.database_url)
     logger.info("Универсальная база данных инициализирована")
 
+    # Открываем соединения пула до первых апдейтов, а не на запросах пользователей
+    try:
+        await db.adapter.warm()
+        logger.info("Пул соединений базы данных прогрет")
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось прогреть пул соединений: {e}")
+
     # Инициализация сервиса статистики
     from services import init_statistics_service
     stats_service = init_statistics_service(db, cache_ttl=300)  # 5 минут кеш
@@ -220,6 +227,7 @@ async def main():
     finally:
         logger.info("🔄 Закрытие соединений...")
         await bot.session.close()
+        await db.close()
 
 
 if __name__ == "__main__":
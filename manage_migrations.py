@@ -110,8 +110,8 @@ async def reset_database(manager):
     print("🗑️ Сброс базы данных...")
     
     # Получаем все примененные миграции в обратном порядке
-    applied_migrations = await manager.get_applied_migrations()
-    applied_migrations.reverse()
+    await manager.init_migrations_table()
+    applied_migrations = sorted(await manager.get_applied_migrations(), reverse=True)
     
     # Откатываем все миграции
     for version in applied_migrations:
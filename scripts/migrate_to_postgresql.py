@@ -19,12 +19,44 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# С какого размера пакета вставлять через COPY вместо executemany
+BULK_COPY_THRESHOLD = 100
+
+
+def _to_datetime(value):
+    """SQLite хранит даты строками, а asyncpg ожидает datetime"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _from_json(value):
+    """SQLite хранит JSON текстом, а кодек JSONB ожидает уже разобранное значение
+
+    Пустая строка - не JSON: переносим как NULL (как миграция 011).
+    Битый JSON сохраняется как JSON-строка, чтобы не потерять данные.
+    """
+    if not isinstance(value, str):
+        return value
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
 class DataMigrator:
     """Класс для миграции данных между базами"""
     
     def __init__(self, sqlite_url: str, postgresql_url: str):
         self.sqlite_adapter = DatabaseAdapter(sqlite_url)
         self.postgresql_adapter = DatabaseAdapter(postgresql_url)
+        # Таблица -> число строк, которые не удалось перенести
+        self.failed_rows = {}
         
     async def migrate_all_data(self):
         """Мигрировать все данные"""
@@ -47,7 +79,11 @@ class DataMigrator:
             await self.migrate_broadcasts()
             await self.migrate_admin_users()
             
-            logger.info("Миграция завершена успешно!")
+            failed = {table: count for table, count in self.failed_rows.items() if count}
+            if failed:
+                logger.warning(f"Миграция завершена с ошибками, не перенесено строк: {failed}")
+            else:
+                logger.info("Миграция завершена успешно!")
             
         except Exception as e:
             logger.error(f"Ошибка миграции: {e}")
@@ -70,6 +106,7 @@ class DataMigrator:
         logger.info(f"Найдено {len(users)} пользователей")
         
         # Вставляем в PostgreSQL
+        failed = 0
         for user in users:
             try:
                 await self.postgresql_adapter.execute("""
@@ -89,9 +126,10 @@ class DataMigrator:
                     user.get('blocked_at')
                 ))
             except Exception as e:
+                failed += 1
                 logger.error(f"Ошибка вставки пользователя {user['user_id']}: {e}")
         
-        logger.info("Пользователи мигрированы")
+        self._report('users', "Пользователи", len(users), failed)
     
     async def migrate_requests(self):
         """Мигрировать запросы"""
@@ -106,19 +144,27 @@ class DataMigrator:
                 
             logger.info(f"Найдено {len(requests)} запросов")
             
-            for request in requests:
-                try:
-                    await self.postgresql_adapter.execute("""
-                        INSERT INTO requests (user_id, channels_input, results, created_at)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        request['user_id'], request.get('channels_input'),
-                        request.get('results'), request.get('created_at')
-                    ))
-                except Exception as e:
-                    logger.error(f"Ошибка вставки запроса {request.get('id')}: {e}")
-            
-            logger.info("Запросы мигрированы")
+            user_ids = await self._migrated_user_ids()
+            rows = self._skip_orphans(requests, user_ids, "запросов")
+            records = [
+                (
+                    request['user_id'], request.get('channels_input'),
+                    _from_json(request.get('results')), _to_datetime(request.get('created_at'))
+                )
+                for request in rows
+            ]
+
+            failed = await self._insert_rows(
+                """
+                INSERT INTO requests (user_id, channels_input, results, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                records,
+                [f"запроса {request.get('id')}" for request in rows],
+                copy_table='requests',
+                copy_columns=['user_id', 'channels_input', 'results', 'created_at']
+            )
+            self._report('requests', "Запросы", len(requests), failed + len(requests) - len(rows))
         except Exception as e:
             logger.warning(f"Таблица requests не найдена или пуста: {e}")
     
@@ -135,28 +181,85 @@ class DataMigrator:
                 
             logger.info(f"Найдено {len(payments)} платежей")
             
-            for payment in payments:
-                try:
-                    await self.postgresql_adapter.execute("""
-                        INSERT INTO payments (
-                            user_id, payment_id, provider_payment_id, amount, currency,
-                            status, invoice_payload, subscription_months, created_at, completed_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ON CONFLICT (payment_id) DO NOTHING
-                    """, (
+            user_ids = await self._migrated_user_ids()
+            rows = self._skip_orphans(payments, user_ids, "платежей")
+
+            # ON CONFLICT недоступен в COPY, поэтому executemany
+            failed = await self._insert_rows(
+                """
+                INSERT INTO payments (
+                    user_id, payment_id, provider_payment_id, amount, currency,
+                    status, invoice_payload, subscription_months, created_at, completed_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (payment_id) DO NOTHING
+                """,
+                [
+                    (
                         payment['user_id'], payment.get('payment_id'),
                         payment.get('provider_payment_id'), payment.get('amount'),
                         payment.get('currency', 'RUB'), payment.get('status', 'pending'),
                         payment.get('invoice_payload'), payment.get('subscription_months', 1),
-                        payment.get('created_at'), payment.get('completed_at')
-                    ))
-                except Exception as e:
-                    logger.error(f"Ошибка вставки платежа {payment.get('payment_id')}: {e}")
-            
-            logger.info("Платежи мигрированы")
+                        _to_datetime(payment.get('created_at')), _to_datetime(payment.get('completed_at'))
+                    )
+                    for payment in rows
+                ],
+                [f"платежа {payment.get('payment_id')}" for payment in rows]
+            )
+            self._report('payments', "Платежи", len(payments), failed + len(payments) - len(rows))
         except Exception as e:
             logger.warning(f"Таблица payments не найдена или пуста: {e}")
     
+    async def _migrated_user_ids(self) -> set:
+        """user_id, которые уже есть в PostgreSQL (на них ссылаются внешние ключи)"""
+        rows = await self.postgresql_adapter.fetch_all("SELECT user_id FROM users")
+        return {row['user_id'] for row in rows}
+
+    def _skip_orphans(self, rows, user_ids: set, label: str) -> list:
+        """Отбросить строки пользователей, которых нет в PostgreSQL: внешний ключ
+        отклонил бы их, а в пакетной вставке - и весь пакет"""
+        kept = [row for row in rows if row['user_id'] in user_ids]
+        if len(kept) < len(rows):
+            logger.warning(f"Пропущено {len(rows) - len(kept)} {label} без пользователя в PostgreSQL")
+        return kept
+
+    async def _insert_rows(self, query: str, records: list, labels: list,
+                           copy_table: str = None, copy_columns: list = None) -> int:
+        """Вставить строки одним пакетом, а если пакет не прошел - по одной
+
+        Пакет (COPY или executemany) атомарен: одна плохая строка откатила бы всю
+        таблицу. Построчная вставка теряет только плохие строки.
+        Возвращает число строк, которые вставить не удалось.
+        """
+        if not records:
+            return 0
+
+        try:
+            if copy_table and len(records) > BULK_COPY_THRESHOLD:
+                # Большой пакет - одна операция COPY вместо N round-trip
+                await self.postgresql_adapter.copy_records(copy_table, records, copy_columns)
+            else:
+                await self.postgresql_adapter.execute_many(query, records)
+            return 0
+        except Exception as e:
+            logger.warning(f"Пакетная вставка не удалась ({e}), вставляем по одной строке")
+
+        failed = 0
+        for record, label in zip(records, labels):
+            try:
+                await self.postgresql_adapter.execute(query, record)
+            except Exception as e:
+                failed += 1
+                logger.error(f"Ошибка вставки {label}: {e}")
+        return failed
+
+    def _report(self, table: str, title: str, total: int, failed: int):
+        """Записать итог по таблице: успех - только если перенесены все строки"""
+        self.failed_rows[table] = failed
+        if failed:
+            logger.error(f"{title} мигрированы частично: {total - failed} из {total}")
+        else:
+            logger.info(f"{title} мигрированы")
+
     async def migrate_broadcasts(self):
         """Мигрировать рассылки (если есть)"""
         logger.info("Проверяем рассылки...")
@@ -263,8 +263,8 @@ class StatisticsService:
             return 0
         if isinstance(result, (list, tuple)):
             return result[0] if result else 0
-        if isinstance(result, dict):
-            # Ищем первое числовое значение
+        if isinstance(result, dict) or hasattr(result, 'values'):
+            # dict или asyncpg.Record - ищем первое числовое значение
             for value in result.values():
                 if isinstance(value, int):
                     return value
@@ -624,8 +624,9 @@ class StatisticsService:
 
             top_users = []
             for row in result:
-                if isinstance(row, dict):
-                    user_data = row.copy()
+                if isinstance(row, dict) or hasattr(row, 'keys'):
+                    # dict или asyncpg.Record - копируем в изменяемый словарь
+                    user_data = dict(row)
                     # Форматируем дату последней активности
                     if user_data.get('last_activity'):
                         if isinstance(user_data['last_activity'], str):
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Тест атомарности миграций админ-панели (SQLite)
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from database.admin_migrations import AdminMigrations
+
+
+def _prepare_bot_tables(db_path: str):
+    """Таблицы бота, которые расширяют миграции админ-панели"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript("""
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT);
+            CREATE TABLE broadcasts (id INTEGER PRIMARY KEY AUTOINCREMENT, message_text TEXT, completed INTEGER DEFAULT 0);
+        """)
+
+
+def _schema(db_path: str) -> set:
+    """Таблицы и индексы базы"""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall()
+    return set(rows)
+
+
+def _executed(db_path: str) -> set:
+    """Выполненные миграции"""
+    with sqlite3.connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT migration_name FROM schema_migrations")}
+
+
+class FailingTablesMigrations(AdminMigrations):
+    """create_all_tables падает посередине: часть таблиц уже создана"""
+
+    _ALL_TABLES_DDL = AdminMigrations._ALL_TABLES_DDL + """
+        CREATE TABLE broken (id INTEGER PRIMARY KEY);
+        CREATE INDEX idx_broken ON broken (no_such_column);
+    """
+
+
+class _Crash(BaseException):
+    """Обрыв прогона (как отмена задачи): обработчики миграций его не глушат"""
+
+
+class CrashingMigrations(AdminMigrations):
+    """Прогон обрывается после последней миграции, до COMMIT"""
+
+    _MIGRATIONS = AdminMigrations._MIGRATIONS + (('crash', '_crash'),)
+
+    async def _crash(self, db):
+        raise _Crash()
+
+
+def test_interrupted_run_leaves_schema_unchanged():
+    """Оборванный прогон не фиксирует ни одной миграции"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bot.db")
+        _prepare_bot_tables(db_path)
+        schema = _schema(db_path)
+
+        try:
+            asyncio.run(CrashingMigrations(db_path).run_migrations())
+        except _Crash:
+            pass
+        else:
+            raise AssertionError("прогон должен был оборваться")
+
+        # Остается только пустая schema_migrations, созданная до транзакции
+        assert _schema(db_path) - schema <= {('table', 'schema_migrations')}, _schema(db_path) - schema
+        assert not _executed(db_path)
+        with sqlite3.connect(db_path) as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        assert columns == {'user_id', 'username'}, columns
+
+
+def test_failed_migration_leaves_schema_unchanged():
+    """Ошибка на середине DDL откатывает все таблицы этой миграции"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bot.db")
+        _prepare_bot_tables(db_path)
+
+        asyncio.run(FailingTablesMigrations(db_path).run_migrations())
+
+        schema = _schema(db_path)
+        tables = {name for kind, name in schema if kind == 'table'}
+        assert not tables & {'admin_users', 'roles', 'audit_logs', 'broadcast_logs', 'broken'}, tables
+        assert 'create_all_tables' not in _executed(db_path)
+
+        # Отпечаток не записан: следующий прогон выполняет миграцию заново
+        asyncio.run(AdminMigrations(db_path).run_migrations())
+
+        tables = {name for kind, name in _schema(db_path) if kind == 'table'}
+        assert {'admin_users', 'roles', 'audit_logs', 'broadcast_logs'} <= tables, tables
+        assert 'broken' not in tables
+        assert 'create_all_tables' in _executed(db_path)
+
+
+def test_migrations_run_once():
+    """Повторный прогон ничего не меняет"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bot.db")
+        _prepare_bot_tables(db_path)
+
+        asyncio.run(AdminMigrations(db_path).run_migrations())
+        schema = _schema(db_path)
+        executed = _executed(db_path)
+        assert executed == {name for name, _ in AdminMigrations._MIGRATIONS}, executed
+
+        asyncio.run(AdminMigrations(db_path).run_migrations())
+        assert _schema(db_path) == schema
+
+
+if __name__ == "__main__":
+    test_interrupted_run_leaves_schema_unchanged()
+    test_failed_migration_leaves_schema_unchanged()
+    test_migrations_run_once()
+    print("✅ Тесты миграций админ-панели пройдены")
@@ -107,6 +107,9 @@ class UnifiedService:
             'admin_panel': {'status': 'unknown', 'last_check': None},
             'telegram_bot': {'status': 'unknown', 'last_check': None}
         }
+        # Состояние миграций (тот же словарь, что обновляет MigrationManager.migrate())
+        from database.migration_manager import migration_status
+        self.health_stats['migrations'] = migration_status
 
         # Настройка обработчиков сигналов
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -232,6 +235,15 @@ class UnifiedService:
     async def apply_migrations(self) -> bool:
         """Применение миграций базы данных"""
         try:
+            # async - миграции идут в фоне и не задерживают запуск бота и админ-панели,
+            # skip - не запускаются; ход фоновых миграций - в health_stats['migrations']
+            migration_mode = os.getenv('MIGRATION_MODE', 'sync').lower()
+            if migration_mode in ('async', 'skip'):
+                import config
+                from database.migration_manager import run_migrations
+                await run_migrations(config.DATABASE_URL, migration_mode)
+                return True
+
             logger.info("🔄 Применение миграций базы данных...")
 
             # Пытаемся использовать production_manager
@@ -548,7 +560,8 @@ class UnifiedService:
                     status_summary = {
                         'БД': self.health_stats['database']['status'],
                         'Админ': self.health_stats['admin_panel']['status'],
-                        'Бот': self.health_stats['telegram_bot']['status']
+                        'Бот': self.health_stats['telegram_bot']['status'],
+                        'Миграции': self.health_stats['migrations']['state']
                     }
                     logger.warning(f"⚠️ Статус сервисов: {status_summary}")
 